@@ -1,18 +1,69 @@
-from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+import hmac
+import logging
+import time
+from typing import Dict, Optional, Tuple
+import jwt
+from jwt import InvalidTokenError
 from passlib.context import CryptContext
 from fastapi import Cookie, HTTPException, status
 from app.config import settings
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Importing bcrypt ensures passlib resolves its fast C-extension backend
+# instead of falling back to the slow pure-python "builtin" implementation.
+import bcrypt  # noqa: F401
+
+# Password hashing context pinned to the OpenBSD "2b" bcrypt variant.
+# The work factor comes from settings so test runs can lower it; the
+# production default stays at bcrypt's standard 12.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    bcrypt__ident="2b",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    deprecated="auto",
+)
+
+# Warn at startup if passlib could not find the native backend, since the
+# builtin fallback dominates login latency (bcrypt is intentionally CPU-heavy)
+if pwd_context.handler("bcrypt").get_backend() == "builtin":
+    logging.getLogger("proxibase").warning(
+        "passlib is using the pure-python bcrypt backend; "
+        "install the 'bcrypt' package for much faster password hashing"
+    )
 
 # Session settings
 SESSION_COOKIE_NAME = "admin_session"
 SESSION_EXPIRE_HOURS = 24
 ALGORITHM = "HS256"
 
+# Verified-token memo: token -> (cache deadline, token exp, payload).
+# Admin pages poll with the same cookie for its whole lifetime, so after
+# the first verification the HMAC + base64 work is a dict hit. A hit is
+# honoured only while both the short cache TTL and the token's own exp
+# hold, so expiry is never extended; only successful verifications are
+# cached, so garbage tokens cannot fill the table beyond the size guard.
+_TOKEN_CACHE_TTL = 30.0
+_TOKEN_CACHE_MAX = 4096
+_token_cache: Dict[str, Tuple[float, int, dict]] = {}
+
+
+def invalidate_session_token(token: str) -> None:
+    """Drop a token from the verification memo (logout)."""
+    _token_cache.pop(token, None)
+
+
+# JWT signing key cached once at import. The key never changes at runtime,
+# so there is no reason to re-read it from settings (and re-derive the HMAC
+# key schedule) on every encode/decode.
+_JWT_SECRET = settings.SECRET_KEY
+
+# Pre-hash the env superadmin password once at startup so logins verify
+# against a bcrypt hash (constant-time internally) instead of comparing
+# the plaintext on every request.
+_ADMIN_PASSWORD_HASH = pwd_context.hash(settings.ADMIN_PASSWORD)
+
+# Expected username pre-encoded once; settings are frozen at startup
+_ADMIN_USERNAME_BYTES = settings.ADMIN_USERNAME.encode("utf-8")
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password."""
@@ -34,13 +85,15 @@ def create_session_token(username: str, role: str = "superadmin") -> str:
     Returns:
         JWT token string
     """
-    expire = datetime.utcnow() + timedelta(hours=SESSION_EXPIRE_HOURS)
+    # Integer epoch math avoids two datetime allocations per token; jwt
+    # accepts the "exp" claim as a plain timestamp
+    exp_ts = int(time.time()) + SESSION_EXPIRE_HOURS * 3600
     to_encode = {
         "sub": username,
         "role": role,
-        "exp": expire
+        "exp": exp_ts
     }
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _JWT_SECRET, algorithm=ALGORITHM)
     return encoded_jwt
 
 
@@ -53,14 +106,28 @@ def verify_session_token(token: str) -> Optional[dict]:
     Returns:
         Decoded token payload or None if invalid
     """
+    entry = _token_cache.get(token)
+    if entry is not None:
+        deadline, exp_ts, cached = entry
+        if time.monotonic() < deadline and time.time() < exp_ts:
+            return cached
+
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, _JWT_SECRET, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         role: str = payload.get("role")
         if username is None:
             return None
-        return {"username": username, "role": role}
-    except JWTError:
+        user_info = {"username": username, "role": role}
+        if len(_token_cache) >= _TOKEN_CACHE_MAX:
+            _token_cache.clear()
+        _token_cache[token] = (
+            time.monotonic() + _TOKEN_CACHE_TTL,
+            payload.get("exp", 0),
+            user_info,
+        )
+        return user_info
+    except InvalidTokenError:
         return None
 
 
@@ -74,9 +141,13 @@ def verify_superadmin_credentials(username: str, password: str) -> bool:
     Returns:
         True if credentials match env superadmin, False otherwise
     """
-    return (
-        username == settings.ADMIN_USERNAME and
-        password == settings.ADMIN_PASSWORD
+    # Constant-time comparison to avoid leaking length/prefix information
+    # through response timing. Bitwise & (not `and`) so the bcrypt verify
+    # always runs regardless of whether the username matched, keeping the
+    # timing profile identical for unknown usernames.
+    return bool(
+        hmac.compare_digest(username.encode("utf-8"), _ADMIN_USERNAME_BYTES) &
+        pwd_context.verify(password, _ADMIN_PASSWORD_HASH)
     )
 
 
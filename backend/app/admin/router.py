@@ -1,18 +1,27 @@
-from fastapi import APIRouter, Request, Form, HTTPException, status, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import APIRouter, Request, Form, HTTPException, status, Depends, Cookie
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+import orjson
 from fastapi.templating import Jinja2Templates
+import asyncio
 import os
+import time
 import logging
+from jinja2 import FileSystemBytecodeCache
 from typing import Optional
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.admin.auth import (
     verify_superadmin_credentials,
     create_session_token,
+    invalidate_session_token,
     get_current_admin,
     SESSION_COOKIE_NAME,
 )
 from app.config import settings
+from app.core.config_helper import invalidate_config_cache
+from app.core.site_cache import invalidate_site_cache
 from app.db.session import get_db
 from app.models.site import Site
 from app.models.global_config import GlobalConfig
@@ -20,16 +29,59 @@ from app.models.global_config import GlobalConfig
 # Phase 9: Get logger for recent errors
 logger = logging.getLogger("proxibase")
 
+# Statements reused on every page load, built once so SQLAlchemy's compiled
+# cache sees the same construct instead of recompiling a fresh expression
+# tree per request
+_SITES_COUNT_STMT = select(func.count(Site.id))
+_ACTIVE_SITES_COUNT_STMT = select(func.count(Site.id)).where(Site.enabled == True)
+_SITES_BY_ID_STMT = select(Site).order_by(Site.id)
+
 router = APIRouter()
 
-# Templates
+# Templates: compiled bytecode is cached on disk and auto-reload is off,
+# so templates are parsed once instead of being re-stat'd on every render.
+# The cache lives inside the app tree next to templates/, not the shared
+# temp dir: Jinja executes marshalled code objects from this directory,
+# so a predictable world-writable location would let any local user
+# plant bytecode the admin panel then runs.
 template_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "templates")
-templates = Jinja2Templates(directory=template_path)
+_jinja_cache_path = os.path.join(os.path.dirname(template_path), ".jinja_cache")
+os.makedirs(_jinja_cache_path, mode=0o700, exist_ok=True)
+if os.stat(_jinja_cache_path).st_uid != os.getuid():
+    raise RuntimeError(
+        f"Refusing to use Jinja bytecode cache not owned by this user: {_jinja_cache_path}"
+    )
+templates = Jinja2Templates(
+    directory=template_path,
+    auto_reload=False,
+    bytecode_cache=FileSystemBytecodeCache(_jinja_cache_path),
+)
+
+# Warm the cache at import so no request pays the first-parse cost
+for _template_name in templates.env.list_templates():
+    templates.env.get_template(_template_name)
+
+
+# Minimum wall-clock time for /login responses. Padding every return path
+# to this floor hides the timing difference between fast failures and the
+# slower bcrypt verify, so response time doesn't reveal username validity.
+# Keep above the observed worst-case bcrypt verify time.
+LOGIN_MIN_SECONDS = 0.25
+
+
+async def pad_login_time(start: float):
+    """Sleep until at least LOGIN_MIN_SECONDS have elapsed since start."""
+    await asyncio.sleep(max(0.0, LOGIN_MIN_SECONDS - (time.perf_counter() - start)))
+
+
+# Admin host precomputed once at import; Host headers are case-insensitive,
+# so comparing lowercased strings also avoids false mismatches on casing
+_ADMIN_HOST_LC = settings.ADMIN_HOST.lower()
 
 
 def check_admin_host(request: Request):
     """Check if request is from admin host."""
-    if request.headers.get("host") != settings.ADMIN_HOST:
+    if request.headers.get("host", "").lower() != _ADMIN_HOST_LC:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin panel not available on this host"
@@ -51,18 +103,27 @@ async def login_page(request: Request):
 async def login(request: Request, username: str = Form(...), password: str = Form(...)):
     """Process login form."""
     check_admin_host(request)
-    
-    # Verify credentials against env superadmin
-    if not verify_superadmin_credentials(username, password):
+
+    start = time.perf_counter()
+
+    # Verify credentials against env superadmin. The bcrypt verify takes
+    # hundreds of milliseconds of CPU, so run it on the thread pool instead
+    # of stalling the event loop; bcrypt's C core releases the GIL, letting
+    # concurrent logins verify in parallel.
+    credentials_ok = await asyncio.to_thread(
+        verify_superadmin_credentials, username, password
+    )
+    if not credentials_ok:
+        await pad_login_time(start)
         return templates.TemplateResponse(
             "admin/login.html",
             {"request": request, "error": "Invalid username or password"},
             status_code=status.HTTP_401_UNAUTHORIZED
         )
-    
+
     # Create session token
     token = create_session_token(username, role="superadmin")
-    
+
     # Redirect to admin panel with session cookie
     response = RedirectResponse(url="/admin", status_code=status.HTTP_303_SEE_OTHER)
     response.set_cookie(
@@ -73,13 +134,16 @@ async def login(request: Request, username: str = Form(...), password: str = For
         samesite="lax",
         max_age=86400  # 24 hours
     )
-    
+
+    await pad_login_time(start)
     return response
 
 
 @router.get("/logout")
-async def logout():
+async def logout(admin_session: Optional[str] = Cookie(None)):
     """Logout and clear session."""
+    if admin_session:
+        invalidate_session_token(admin_session)
     response = RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
     response.delete_cookie(SESSION_COOKIE_NAME)
     return response
@@ -95,8 +159,8 @@ async def admin_panel(
     check_admin_host(request)
     
     # Get stats
-    sites_count = await db.scalar(select(func.count(Site.id)))
-    active_sites_count = await db.scalar(select(func.count(Site.id)).where(Site.enabled == True))
+    sites_count = await db.scalar(_SITES_COUNT_STMT)
+    active_sites_count = await db.scalar(_ACTIVE_SITES_COUNT_STMT)
     
     return templates.TemplateResponse(
         "admin/panel.html",
@@ -121,7 +185,7 @@ async def list_sites(
     check_admin_host(request)
     
     # Get all sites
-    result = await db.execute(select(Site).order_by(Site.id))
+    result = await db.execute(_SITES_BY_ID_STMT)
     sites = result.scalars().all()
     
     return templates.TemplateResponse(
@@ -174,10 +238,35 @@ async def create_site(
 ):
     """Create a new site."""
     check_admin_host(request)
-    
-    # Check if mirror_root already exists
-    result = await db.execute(select(Site).where(Site.mirror_root == mirror_root))
-    if result.scalar_one_or_none():
+
+    # Insert and duplicate check fused into one atomic statement: the unique
+    # index on mirror_root rejects duplicates, and RETURNING tells us whether
+    # the row was actually inserted (no separate SELECT, no TOCTOU race)
+    stmt = (
+        sqlite_insert(Site)
+        .values(
+            mirror_root=mirror_root,
+            source_root=source_root,
+            enabled=enabled,
+            proxy_subdomains=proxy_subdomains,
+            proxy_external_domains=proxy_external_domains,
+            rewrite_js_redirects=rewrite_js_redirects,
+            remove_ads=remove_ads,
+            inject_ads=inject_ads,
+            remove_analytics=remove_analytics,
+            media_policy=media_policy if media_policy else None,
+            session_mode=session_mode if session_mode else None,
+            custom_ad_html=custom_ad_html if custom_ad_html else None,
+            custom_tracker_js=custom_tracker_js if custom_tracker_js else None
+        )
+        .on_conflict_do_nothing(index_elements=["mirror_root"])
+        .returning(Site.id)
+    )
+    result = await db.execute(stmt)
+    new_site_id = result.scalar()
+
+    if new_site_id is None:
+        await db.rollback()
         return templates.TemplateResponse(
             "admin/site_form.html",
             {
@@ -189,28 +278,11 @@ async def create_site(
             },
             status_code=status.HTTP_400_BAD_REQUEST
         )
-    
-    # Create new site
-    new_site = Site(
-        mirror_root=mirror_root,
-        source_root=source_root,
-        enabled=enabled,
-        proxy_subdomains=proxy_subdomains,
-        proxy_external_domains=proxy_external_domains,
-        rewrite_js_redirects=rewrite_js_redirects,
-        remove_ads=remove_ads,
-        inject_ads=inject_ads,
-        remove_analytics=remove_analytics,
-        media_policy=media_policy if media_policy else None,
-        session_mode=session_mode if session_mode else None,
-        custom_ad_html=custom_ad_html if custom_ad_html else None,
-        custom_tracker_js=custom_tracker_js if custom_tracker_js else None
-    )
-    
-    db.add(new_site)
+
     await db.commit()
-    await db.refresh(new_site)
-    
+    invalidate_config_cache()
+    invalidate_site_cache()
+
     return RedirectResponse(url="/admin/sites", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -224,8 +296,7 @@ async def edit_site_form(
     """Display edit site form."""
     check_admin_host(request)
     
-    result = await db.execute(select(Site).where(Site.id == site_id))
-    site = result.scalar_one_or_none()
+    site = await db.get(Site, site_id)
     
     if not site:
         raise HTTPException(status_code=404, detail="Site not found")
@@ -264,45 +335,59 @@ async def update_site(
     """Update an existing site."""
     check_admin_host(request)
     
-    result = await db.execute(select(Site).where(Site.id == site_id))
-    site = result.scalar_one_or_none()
-    
+    site = await db.get(Site, site_id)
+
     if not site:
         raise HTTPException(status_code=404, detail="Site not found")
-    
-    # Check if mirror_root is being changed and if it conflicts
-    if site.mirror_root != mirror_root:
-        result = await db.execute(select(Site).where(Site.mirror_root == mirror_root))
-        if result.scalar_one_or_none():
-            return templates.TemplateResponse(
-                "admin/site_form.html",
-                {
-                    "request": request,
-                    "admin": current_admin,
-                    "site": site,
-                    "action": "edit",
-                    "error": f"Site with mirror root '{mirror_root}' already exists"
-                },
-                status_code=status.HTTP_400_BAD_REQUEST
-            )
-    
-    # Update site
-    site.mirror_root = mirror_root
-    site.source_root = source_root
-    site.enabled = enabled
-    site.proxy_subdomains = proxy_subdomains
-    site.proxy_external_domains = proxy_external_domains
-    site.rewrite_js_redirects = rewrite_js_redirects
-    site.remove_ads = remove_ads
-    site.inject_ads = inject_ads
-    site.remove_analytics = remove_analytics
-    site.media_policy = media_policy if media_policy else None
-    site.session_mode = session_mode if session_mode else None
-    site.custom_ad_html = custom_ad_html if custom_ad_html else None
-    site.custom_tracker_js = custom_tracker_js if custom_tracker_js else None
-    
+
+    # Update guarded by the rename-conflict check in a single statement:
+    # the UPDATE only applies if no *other* site already owns mirror_root,
+    # replacing the separate conflict SELECT and avoiding the race with it
+    other_site = aliased(Site)
+    conflict = (
+        select(other_site.id)
+        .where(other_site.mirror_root == mirror_root, other_site.id != site_id)
+        .exists()
+    )
+    stmt = (
+        update(Site)
+        .where(Site.id == site_id, ~conflict)
+        .values(
+            mirror_root=mirror_root,
+            source_root=source_root,
+            enabled=enabled,
+            proxy_subdomains=proxy_subdomains,
+            proxy_external_domains=proxy_external_domains,
+            rewrite_js_redirects=rewrite_js_redirects,
+            remove_ads=remove_ads,
+            inject_ads=inject_ads,
+            remove_analytics=remove_analytics,
+            media_policy=media_policy if media_policy else None,
+            session_mode=session_mode if session_mode else None,
+            custom_ad_html=custom_ad_html if custom_ad_html else None,
+            custom_tracker_js=custom_tracker_js if custom_tracker_js else None
+        )
+    )
+    result = await db.execute(stmt)
+
+    if result.rowcount == 0:
+        await db.rollback()
+        return templates.TemplateResponse(
+            "admin/site_form.html",
+            {
+                "request": request,
+                "admin": current_admin,
+                "site": site,
+                "action": "edit",
+                "error": f"Site with mirror root '{mirror_root}' already exists"
+            },
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
     await db.commit()
-    
+    invalidate_config_cache()
+    invalidate_site_cache()
+
     return RedirectResponse(url="/admin/sites", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -316,15 +401,16 @@ async def delete_site(
     """Delete a site."""
     check_admin_host(request)
     
-    result = await db.execute(select(Site).where(Site.id == site_id))
-    site = result.scalar_one_or_none()
+    site = await db.get(Site, site_id)
     
     if not site:
         raise HTTPException(status_code=404, detail="Site not found")
     
     await db.delete(site)
     await db.commit()
-    
+    invalidate_config_cache()
+    invalidate_site_cache()
+
     return RedirectResponse(url="/admin/sites", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -340,8 +426,7 @@ async def settings_page(
     check_admin_host(request)
     
     # Get or create GlobalConfig (id=1)
-    result = await db.execute(select(GlobalConfig).where(GlobalConfig.id == 1))
-    config = result.scalar_one_or_none()
+    config = await db.get(GlobalConfig, 1)
     
     if not config:
         # Create default global config if it doesn't exist
@@ -380,8 +465,7 @@ async def update_settings(
     check_admin_host(request)
     
     # Get or create GlobalConfig
-    result = await db.execute(select(GlobalConfig).where(GlobalConfig.id == 1))
-    config = result.scalar_one_or_none()
+    config = await db.get(GlobalConfig, 1)
     
     if not config:
         config = GlobalConfig(id=1)
@@ -398,9 +482,10 @@ async def update_settings(
     config.session_mode = session_mode
     config.custom_ad_html = custom_ad_html if custom_ad_html else None
     config.custom_tracker_js = custom_tracker_js if custom_tracker_js else None
-    
+
     await db.commit()
-    
+    invalidate_config_cache()
+
     return RedirectResponse(url="/admin/settings", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -415,23 +500,23 @@ async def get_dashboard_stats(
     Phase 9: API endpoint for dashboard statistics.
     Returns total sites, active sites, and system configuration.
     """
-    # Get site counts
-    total_sites = await db.scalar(select(func.count(Site.id)))
-    active_sites = await db.scalar(select(func.count(Site.id)).where(Site.enabled == True))
-    
-    # Get all sites for detailed view
-    result = await db.execute(select(Site).order_by(Site.id))
+    # Get all sites for detailed view; counts are derived from this list
+    # instead of issuing two extra COUNT(*) round-trips to the database
+    result = await db.execute(_SITES_BY_ID_STMT)
     sites = result.scalars().all()
-    
+
+    total_sites = len(sites)
+    active_sites = sum(1 for site in sites if site.enabled)
+
     # Get global config
-    config_result = await db.execute(select(GlobalConfig).where(GlobalConfig.id == 1))
-    global_config = config_result.scalar_one_or_none()
-    
-    # Build response
-    return JSONResponse({
-        "total_sites": total_sites or 0,
-        "active_sites": active_sites or 0,
-        "inactive_sites": (total_sites or 0) - (active_sites or 0),
+    global_config = await db.get(GlobalConfig, 1)
+    
+    # Build response; orjson serializes to bytes in a single C-level pass,
+    # avoiding JSONResponse's stdlib json.dumps plus str->bytes re-encode
+    payload = {
+        "total_sites": total_sites,
+        "active_sites": active_sites,
+        "inactive_sites": total_sites - active_sites,
         "rate_limit_config": {
             "enabled": settings.ENABLE_RATE_LIMITING,
             "max_requests": settings.RATE_LIMIT_REQUESTS,
@@ -456,4 +541,6 @@ async def get_dashboard_stats(
             "remove_ads": global_config.remove_ads if global_config else None,
             "session_mode": global_config.session_mode if global_config else None
         } if global_config else None
-    })
+    }
+
+    return Response(orjson.dumps(payload), media_type="application/json")
@@ -7,6 +7,10 @@ class Settings(BaseSettings):
     ADMIN_HOST: str = "0.0.0.0"
     ADMIN_USERNAME: str = "admin"
     ADMIN_PASSWORD: str = "admin123"
+    # bcrypt work factor for password hashing. Production default; CI
+    # lowers it via the environment (see tests/conftest.py) so the auth
+    # tests are not dominated by deliberately slow hashing.
+    BCRYPT_ROUNDS: int = 12
     SECRET_KEY: str = "your-secret-key-change-in-production-1234567890"
     MONGO_URL: Optional[str] = "mongodb://localhost:27017"
     DB_NAME: Optional[str] = "test_database"
@@ -23,6 +27,18 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = True
         extra = "allow"
+        frozen = True  # Settings are immutable after startup
 
 
 settings = Settings()
+
+# Hot-path settings hoisted to plain module-level constants. These fields
+# are read on every proxied request; binding them once at import skips the
+# pydantic attribute machinery entirely.
+SECRET_KEY = settings.SECRET_KEY
+ADMIN_HOST = settings.ADMIN_HOST
+RATE_LIMIT_REQUESTS = settings.RATE_LIMIT_REQUESTS
+RATE_LIMIT_WINDOW = settings.RATE_LIMIT_WINDOW
+MAX_RESPONSE_SIZE_MB = settings.MAX_RESPONSE_SIZE_MB
+REQUEST_TIMEOUT = settings.REQUEST_TIMEOUT
+ENABLE_RATE_LIMITING = settings.ENABLE_RATE_LIMITING
@@ -1,30 +1,96 @@
+import operator
+from typing import Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.models.site import Site
 from app.models.global_config import GlobalConfig
 
+# Configuration attributes shared by Site and GlobalConfig, in the order
+# they appear in the effective config dict. attrgetter fetches all ten in
+# a single C-level call instead of ten Python-level attribute lookups.
+_CONFIG_KEYS = (
+    "proxy_subdomains",
+    "proxy_external_domains",
+    "rewrite_js_redirects",
+    "remove_ads",
+    "inject_ads",
+    "remove_analytics",
+    "media_policy",
+    "session_mode",
+    "custom_ad_html",
+    "custom_tracker_js",
+)
+_GET_CONFIG_VALUES = operator.attrgetter(*_CONFIG_KEYS)
+
+# Cache of merged configs keyed by site id. get_effective_config runs on
+# every proxied request but its inputs only change when an admin edits a
+# Site or the GlobalConfig, so the admin routes clear this cache after
+# each commit via invalidate_config_cache().
+_CONFIG_CACHE: Dict[int, dict] = {}
+
+# The GlobalConfig row itself, cached for the same lifetime: it only
+# changes through the admin settings form, which invalidates below
+_GLOBAL_CONFIG: Optional[GlobalConfig] = None
+
+
+def invalidate_config_cache():
+    """Clear cached effective configs after a Site or GlobalConfig change."""
+    global _GLOBAL_CONFIG
+    _GLOBAL_CONFIG = None
+    _CONFIG_CACHE.clear()
+
+
+async def get_global_config(db: AsyncSession) -> GlobalConfig:
+    """
+    Get the GlobalConfig singleton, cached in process memory.
+
+    The per-request SELECT only happens on first use or after an admin
+    write invalidated the cache; a missing row is created once.
+
+    Args:
+        db: Database session used on a cache miss
+
+    Returns:
+        The GlobalConfig instance
+    """
+    global _GLOBAL_CONFIG
+    global_config = _GLOBAL_CONFIG
+    if global_config is None:
+        global_config = await db.get(GlobalConfig, 1)
+        if not global_config:
+            global_config = GlobalConfig(id=1)
+            db.add(global_config)
+            await db.commit()
+            await db.refresh(global_config)
+        _GLOBAL_CONFIG = global_config
+    return global_config
+
 
 def get_effective_config(site: Site, global_config: GlobalConfig) -> dict:
     """
     Get the effective configuration for a site by merging site-specific
     config with global config defaults.
-    
+
     Any None value in Site config falls back to GlobalConfig value.
-    
+
     Args:
         site: The Site instance
         global_config: The GlobalConfig instance
-    
+
     Returns:
         Dictionary with effective configuration
     """
-    return {
-        "proxy_subdomains": site.proxy_subdomains if site.proxy_subdomains is not None else global_config.proxy_subdomains,
-        "proxy_external_domains": site.proxy_external_domains if site.proxy_external_domains is not None else global_config.proxy_external_domains,
-        "rewrite_js_redirects": site.rewrite_js_redirects if site.rewrite_js_redirects is not None else global_config.rewrite_js_redirects,
-        "remove_ads": site.remove_ads if site.remove_ads is not None else global_config.remove_ads,
-        "inject_ads": site.inject_ads if site.inject_ads is not None else global_config.inject_ads,
-        "remove_analytics": site.remove_analytics if site.remove_analytics is not None else global_config.remove_analytics,
-        "media_policy": site.media_policy if site.media_policy is not None else global_config.media_policy,
-        "session_mode": site.session_mode if site.session_mode is not None else global_config.session_mode,
-        "custom_ad_html": site.custom_ad_html if site.custom_ad_html is not None else global_config.custom_ad_html,
-        "custom_tracker_js": site.custom_tracker_js if site.custom_tracker_js is not None else global_config.custom_tracker_js,
+    cached = _CONFIG_CACHE.get(site.id)
+    if cached is not None:
+        return cached
+
+    site_values = _GET_CONFIG_VALUES(site)
+    global_values = _GET_CONFIG_VALUES(global_config)
+    merged = {
+        key: site_value if site_value is not None else global_value
+        for key, site_value, global_value in zip(_CONFIG_KEYS, site_values, global_values)
     }
+
+    _CONFIG_CACHE[site.id] = merged
+    return merged
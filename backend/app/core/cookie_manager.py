@@ -4,14 +4,26 @@ Cookie Management for Cookie Jar Feature (Phase 8)
 Handles parsing, storing, and retrieving cookies for the cookie jar.
 """
 
-import json
+import re
 from typing import Dict, List, Optional
+
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from urllib.parse import urlparse
 
 from app.models.cookie_jar import CookieJar
 
+# Precompiled patterns so cookie parsing runs in the C regex engine
+# instead of a Python-level split/strip loop on every request.
+# Matches "name=value" pairs, trimming surrounding whitespace.
+_COOKIE_PAIR_RE = re.compile(r"\s*([^=;\s]+)\s*=\s*([^;]*?)\s*(?:;|$)")
+
+# Matches the leading "name=value" of a Set-Cookie header (attributes after
+# the first semicolon are ignored).
+_SET_COOKIE_PAIR_RE = re.compile(r"\s*([^=;]+?)\s*=\s*([^;]*?)\s*(?:;|$)")
+
 
 def parse_set_cookie_headers(headers: Dict[str, str]) -> List[str]:
     """
@@ -53,17 +65,10 @@ def parse_cookie_header(cookie_string: str) -> Dict[str, str]:
     Returns:
         Dictionary of cookie name -> value
     """
-    cookies = {}
     if not cookie_string:
-        return cookies
-    
-    for cookie in cookie_string.split(';'):
-        cookie = cookie.strip()
-        if '=' in cookie:
-            name, value = cookie.split('=', 1)
-            cookies[name.strip()] = value.strip()
-    
-    return cookies
+        return {}
+
+    return dict(_COOKIE_PAIR_RE.findall(cookie_string))
 
 
 def build_cookie_header(cookies: Dict[str, str]) -> str:
@@ -78,8 +83,10 @@ def build_cookie_header(cookies: Dict[str, str]) -> str:
     """
     if not cookies:
         return ""
-    
-    return "; ".join(f"{name}={value}" for name, value in cookies.items())
+
+    # Plain concatenation beats per-cookie f-string formatting on the
+    # proxy's forwarding path
+    return "; ".join(name + "=" + value for name, value in cookies.items())
 
 
 async def store_cookies(
@@ -111,46 +118,34 @@ async def store_cookies(
     
     for set_cookie in set_cookie_headers:
         # Extract the name=value part (before first semicolon)
-        cookie_pair = set_cookie.split(';')[0].strip()
-        if '=' in cookie_pair:
-            name, value = cookie_pair.split('=', 1)
-            cookies[name.strip()] = value.strip()
+        match = _SET_COOKIE_PAIR_RE.match(set_cookie)
+        if match:
+            cookies[match.group(1)] = match.group(2)
     
     if not cookies:
         return
-    
-    # Look up existing cookie jar entry
-    result = await db.execute(
-        select(CookieJar).where(
-            CookieJar.site_id == site_id,
-            CookieJar.session_id == session_id,
-            CookieJar.origin_host == origin_host
-        )
+
+    # Single-statement upsert against the unique (site_id, session_id,
+    # origin_host) index. On conflict, json_patch merges the new cookies
+    # into the stored JSON (new values overwrite existing names), which
+    # replaces the old read-modify-write round trip.
+    stmt = sqlite_insert(CookieJar).values(
+        site_id=site_id,
+        session_id=session_id,
+        origin_host=origin_host,
+        cookie_data=orjson.dumps(cookies).decode()
     )
-    cookie_jar = result.scalar_one_or_none()
-    
-    if cookie_jar:
-        # Update existing entry - merge with existing cookies
-        existing_cookies = {}
-        if cookie_jar.cookie_data:
-            try:
-                existing_cookies = json.loads(cookie_jar.cookie_data)
-            except json.JSONDecodeError:
-                pass
-        
-        # Merge new cookies (overwrites existing with same name)
-        existing_cookies.update(cookies)
-        cookie_jar.cookie_data = json.dumps(existing_cookies)
-    else:
-        # Create new entry
-        cookie_jar = CookieJar(
-            site_id=site_id,
-            session_id=session_id,
-            origin_host=origin_host,
-            cookie_data=json.dumps(cookies)
-        )
-        db.add(cookie_jar)
-    
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["site_id", "session_id", "origin_host"],
+        set_={
+            "cookie_data": func.json_patch(
+                func.coalesce(CookieJar.cookie_data, "{}"),
+                stmt.excluded.cookie_data
+            )
+        }
+    )
+
+    await db.execute(stmt)
     await db.commit()
 
 
@@ -172,19 +167,22 @@ async def get_cookies(
     Returns:
         Dictionary of cookie name -> value
     """
+    # Only the JSON blob is needed, so select the column rather than the
+    # mapped entity; that skips ORM row materialization and identity-map
+    # bookkeeping on every cookie-jar request
     result = await db.execute(
-        select(CookieJar).where(
+        select(CookieJar.cookie_data).where(
             CookieJar.site_id == site_id,
             CookieJar.session_id == session_id,
             CookieJar.origin_host == origin_host
         )
     )
-    cookie_jar = result.scalar_one_or_none()
-    
-    if not cookie_jar or not cookie_jar.cookie_data:
+    cookie_data = result.scalar_one_or_none()
+
+    if not cookie_data:
         return {}
-    
+
     try:
-        return json.loads(cookie_jar.cookie_data)
-    except json.JSONDecodeError:
+        return orjson.loads(cookie_data)
+    except orjson.JSONDecodeError:
         return {}
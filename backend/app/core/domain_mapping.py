@@ -1,7 +1,14 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
 def map_mirror_host_to_origin_host(mirror_host: str, mirror_root: str, source_root: str) -> str:
     """
     Maps a mirror host to its origin host.
-    
+
+    This runs on every proxied request, and there are only O(sites) x
+    O(subdomains) distinct inputs in practice, so results are memoized.
+
     Rules:
     - If mirror_host equals mirror_root exactly, return source_root
     - If mirror_host ends with '.' + mirror_root, extract the subdomain prefix
@@ -0,0 +1,57 @@
+"""
+ProxiBase Shared HTTP Client
+Process-wide httpx.AsyncClient with keep-alive pools to origins
+"""
+
+from typing import Optional
+
+import httpx
+
+# Shared client instance, created at application startup. Reusing one
+# client across requests keeps origin connections alive in its pool, so
+# repeat requests to the same origin skip the TCP + TLS handshake that a
+# per-request client pays every time.
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def init_http_client(timeout_seconds: float) -> httpx.AsyncClient:
+    """
+    Create the shared origin-facing HTTP client.
+
+    Args:
+        timeout_seconds: Per-request timeout applied to origin fetches
+
+    Returns:
+        The created httpx.AsyncClient
+    """
+    global http_client
+    http_client = httpx.AsyncClient(
+        follow_redirects=False,
+        # Bound connection establishment separately: a dead origin should
+        # fail fast instead of consuming the whole read budget
+        timeout=httpx.Timeout(timeout_seconds, connect=5.0),
+        limits=httpx.Limits(
+            max_keepalive_connections=200,
+            max_connections=1000,
+            keepalive_expiry=30.0,
+        ),
+    )
+    return http_client
+
+
+async def close_http_client():
+    """Close the shared client and its pooled connections on shutdown."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client instance.
+
+    Returns:
+        httpx.AsyncClient instance
+    """
+    return http_client
@@ -4,132 +4,227 @@ Simple in-memory rate limiter per client IP
 """
 
 import time
-from collections import defaultdict
+from array import array
 from typing import Dict, Tuple
 from threading import Lock
 
+# Number of independent (lock, dict) shards. Power of two so the shard
+# index is a single & instead of a %. 16 shards is plenty to keep
+# unrelated IPs from contending on one global lock.
+_NUM_SHARDS = 16
+_SHARD_MASK = _NUM_SHARDS - 1
+
+
+class _Window:
+    """
+    Compact per-IP sliding-window record.
+
+    The counters live in a packed C array (4 bytes per bucket) and the
+    scalars in fixed slots, so each tracked IP costs a single small object
+    plus one contiguous buffer instead of a Python list of boxed values.
+    """
+
+    __slots__ = ('head', 'total', 'counters', 'oldest')
+
+    def __init__(self, now_s: int, window_seconds: int):
+        # counters[t % window_seconds] holds the request count for second t
+        self.head = now_s
+        self.total = 0
+        self.counters = array('I', [0]) * window_seconds
+        self.oldest = now_s
+
 
 class InMemoryRateLimiter:
     """
-    Simple in-memory rate limiter using sliding window algorithm.
-    Tracks requests per IP address within a time window.
+    In-memory rate limiter using a bucketed sliding window algorithm.
+
+    Each IP gets a fixed ring of per-second counters covering the window,
+    instead of an unbounded timestamp list. Admission advances the ring
+    head, zeroes the buckets that fell out of the window, bumps the
+    current bucket and compares a running total - O(1) work per request
+    with no per-request list allocations.
+
+    State is sharded into independent (lock, dict) pairs keyed by IP hash,
+    so concurrent requests from different clients rarely contend on the
+    same lock. (threading.Lock is already the raw _thread lock, so there
+    is no wrapper overhead per acquisition.)
     """
-    
+
     def __init__(self, max_requests: int = 60, window_seconds: int = 60):
         """
         Initialize the rate limiter.
-        
+
         Args:
             max_requests: Maximum number of requests allowed per window
             window_seconds: Time window in seconds
         """
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        
-        # Store timestamps of requests per IP
-        # Format: {ip: [timestamp1, timestamp2, ...]}
-        self.request_log: Dict[str, list] = defaultdict(list)
-        
-        # Lock for thread safety
-        self.lock = Lock()
-    
+
+        # Below this total the lock-free fast path may admit; the last 10%
+        # of headroom always goes through the precise locked path
+        self._fast_threshold = int(max_requests * 0.9)
+
+        # Each shard is (lock, request_log) mapping IP -> _Window
+        self._shards = tuple(
+            (Lock(), {}) for _ in range(_NUM_SHARDS)
+        )
+
+    def _shard_for(self, client_ip: str) -> Tuple[Lock, Dict[str, _Window]]:
+        """Pick the (lock, log) shard responsible for an IP."""
+        return self._shards[hash(client_ip) & _SHARD_MASK]
+
+    def _advance(self, entry: _Window, now_s: int):
+        """
+        Advance an entry's ring head to now_s, zeroing buckets that
+        dropped out of the window and subtracting them from the total.
+        """
+        elapsed = now_s - entry.head
+        if elapsed <= 0:
+            return
+
+        window = self.window_seconds
+        counters = entry.counters
+
+        if elapsed >= window:
+            # Whole window expired; reset everything
+            for i in range(window):
+                counters[i] = 0
+            entry.total = 0
+        else:
+            # Zero only the seconds that rolled out of the window
+            for t in range(entry.head + 1, now_s + 1):
+                i = t % window
+                entry.total -= counters[i]
+                counters[i] = 0
+
+            # If the oldest live second just expired, walk forward to the
+            # next non-empty bucket (amortized O(1): each bucket is visited
+            # at most once per window)
+            if entry.total and entry.oldest <= now_s - window:
+                for t in range(now_s - window + 1, now_s + 1):
+                    if counters[t % window]:
+                        entry.oldest = t
+                        break
+
+        entry.head = now_s
+
     def is_allowed(self, client_ip: str) -> Tuple[bool, int]:
         """
         Check if a request from the given IP is allowed.
-        
+
         Args:
             client_ip: The client IP address
-        
+
         Returns:
             Tuple of (is_allowed: bool, remaining_requests: int)
         """
-        with self.lock:
-            current_time = time.time()
-            cutoff_time = current_time - self.window_seconds
-            
-            # Get request history for this IP
-            requests = self.request_log[client_ip]
-            
-            # Remove old requests outside the window
-            self.request_log[client_ip] = [
-                ts for ts in requests if ts > cutoff_time
-            ]
-            
+        # Read the clock and resolve the shard before taking the lock, so
+        # the critical section is just a few dict/array operations. An
+        # uncontended threading.Lock acquire is a single atomic compare-and
+        # -swap in C, so the locked fast path is already about as cheap as a
+        # hand-rolled CAS loop would be in pure Python.
+        now_s = int(time.time())
+        # Hoist attribute lookups out of the locked region; each dotted
+        # access is a dict lookup per bytecode
+        max_requests = self.max_requests
+        window = self.window_seconds
+        lock, log = self._shard_for(client_ip)
+
+        # Fast path: same-second entry far below the limit. The GIL makes
+        # each mutation atomic; a rare interleaving with another thread can
+        # miscount by one, which is harmless this far from the threshold.
+        # Admissions near the limit always take the precise locked path.
+        entry = log.get(client_ip)
+        if (
+            entry is not None
+            and entry.head == now_s
+            and 0 < entry.total < self._fast_threshold
+        ):
+            entry.counters[now_s % window] += 1
+            entry.total += 1
+            return True, max_requests - entry.total
+
+        with lock:
+            entry = log.get(client_ip)
+            if entry is None:
+                entry = log[client_ip] = _Window(now_s, window)
+            else:
+                self._advance(entry, now_s)
+
             # Check if limit is exceeded
-            current_count = len(self.request_log[client_ip])
-            
-            if current_count >= self.max_requests:
+            total = entry.total
+            if total >= max_requests:
                 # Rate limit exceeded
                 return False, 0
-            
-            # Add current request timestamp
-            self.request_log[client_ip].append(current_time)
-            
-            # Calculate remaining requests
-            remaining = self.max_requests - (current_count + 1)
-            
-            return True, remaining
-    
+
+            # Count the current request in its bucket
+            entry.counters[now_s % window] += 1
+            if total == 0:
+                entry.oldest = now_s
+            total += 1
+            entry.total = total
+
+            return True, max_requests - total
+
     def get_retry_after(self, client_ip: str) -> int:
         """
         Get the number of seconds until the client can retry.
-        
+
         Args:
             client_ip: The client IP address
-        
+
         Returns:
             Seconds until retry is allowed
         """
-        with self.lock:
-            requests = self.request_log.get(client_ip, [])
-            
-            if not requests:
+        now_s = int(time.time())
+        lock, log = self._shard_for(client_ip)
+        with lock:
+            entry = log.get(client_ip)
+            if entry is None:
                 return 0
-            
-            # Oldest request in the window
-            oldest_request = min(requests)
-            current_time = time.time()
-            
-            # Time until oldest request expires
-            retry_after = self.window_seconds - (current_time - oldest_request)
-            
-            return max(0, int(retry_after))
-    
+
+            self._advance(entry, now_s)
+            if entry.total == 0:
+                return 0
+
+            # The client can retry once the oldest live second expires
+            return max(0, entry.oldest + self.window_seconds - now_s)
+
     def reset(self, client_ip: str = None):
         """
         Reset rate limit tracking.
-        
+
         Args:
             client_ip: If provided, reset only for this IP. Otherwise reset all.
         """
-        with self.lock:
-            if client_ip:
-                self.request_log.pop(client_ip, None)
-            else:
-                self.request_log.clear()
-    
+        if client_ip:
+            lock, log = self._shard_for(client_ip)
+            with lock:
+                log.pop(client_ip, None)
+        else:
+            for lock, log in self._shards:
+                with lock:
+                    log.clear()
+
     def cleanup_old_entries(self):
         """
         Cleanup old entries to prevent memory bloat.
         Should be called periodically.
         """
-        with self.lock:
-            current_time = time.time()
-            cutoff_time = current_time - self.window_seconds
-            
-            # Remove IPs with no recent requests
-            ips_to_remove = []
-            for ip, requests in self.request_log.items():
-                # Filter old requests
-                recent_requests = [ts for ts in requests if ts > cutoff_time]
-                
-                if not recent_requests:
-                    ips_to_remove.append(ip)
-                else:
-                    self.request_log[ip] = recent_requests
-            
-            for ip in ips_to_remove:
-                del self.request_log[ip]
+        cutoff = int(time.time()) - self.window_seconds
+
+        # Sweep one shard at a time so cleanup never stalls the whole limiter
+        for lock, log in self._shards:
+            with lock:
+                # Remove IPs whose whole window has expired
+                ips_to_remove = [
+                    ip for ip, entry in log.items()
+                    if entry.head <= cutoff
+                ]
+
+                for ip in ips_to_remove:
+                    del log[ip]
 
 
 # Global rate limiter instance
@@ -140,7 +235,7 @@ rate_limiter: InMemoryRateLimiter = None
 def init_rate_limiter(max_requests: int, window_seconds: int):
     """
     Initialize the global rate limiter.
-    
+
     Args:
         max_requests: Maximum requests per window
         window_seconds: Window size in seconds
@@ -152,7 +247,7 @@ def init_rate_limiter(max_requests: int, window_seconds: int):
 def get_rate_limiter() -> InMemoryRateLimiter:
     """
     Get the global rate limiter instance.
-    
+
     Returns:
         InMemoryRateLimiter instance
     """
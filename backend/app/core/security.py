@@ -3,16 +3,134 @@ ProxiBase Security Module - Phase 9
 SSRF protection and target validation utilities
 """
 
+import asyncio
+import functools
 import socket
 import ipaddress
+import time
 from urllib.parse import urlparse
-from typing import Tuple
+from typing import Dict, Optional, Tuple
+
+# Cached host verdicts shared by the sync and async entry points, so
+# repeat origins skip both the DNS lookup and the ipaddress parsing.
+# Entries carry an expiry so DNS changes are picked up within a minute;
+# the cache is flushed wholesale when full and DNS failures are never
+# cached.
+_HOST_CACHE_MAX = 4096
+_HOST_CACHE_TTL = 60.0
+_host_cache: Dict[str, Tuple[float, Tuple[bool, str]]] = {}
+
+
+@functools.lru_cache(maxsize=4096)
+def _classify_ip(ip_str: str) -> Tuple[bool, str]:
+    """
+    Classify a resolved IP string as safe or blocked.
+
+    Memoized: many hostnames resolve to the same CDN addresses, and on a
+    hit this skips the ipaddress object construction entirely.
+
+    The ipaddress properties already cover the blocked ranges:
+    is_loopback (127.0.0.0/8, ::1), is_private (10.0.0.0/8,
+    172.16.0.0/12, 192.168.0.0/16) and is_link_local (169.254.0.0/16).
+    """
+    ip = ipaddress.ip_address(ip_str)
+
+    if ip.is_loopback:
+        return False, f"Blocked: loopback address {ip_str}"
+
+    if ip.is_private:
+        return False, f"Blocked: private IP address {ip_str}"
+
+    if ip.is_reserved:
+        return False, f"Blocked: reserved IP address {ip_str}"
+
+    if ip.is_link_local:
+        return False, f"Blocked: link-local address {ip_str}"
+
+    return True, "OK"
+
+
+def _cache_verdict(hostname: str, verdict: Tuple[bool, str]) -> Tuple[bool, str]:
+    """Store a classification verdict, flushing the cache if it is full."""
+    if len(_host_cache) >= _HOST_CACHE_MAX:
+        _host_cache.clear()
+    _host_cache[hostname] = (time.monotonic() + _HOST_CACHE_TTL, verdict)
+    return verdict
+
+
+def _cached_verdict(hostname: str) -> Optional[Tuple[bool, str]]:
+    """Return a cached, unexpired verdict for a hostname, if any."""
+    entry = _host_cache.get(hostname)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _classify_host(hostname: str) -> Tuple[bool, str]:
+    """Resolve a hostname (blocking) and classify the resulting IP."""
+    cached = _cached_verdict(hostname)
+    if cached is not None:
+        return cached
+
+    try:
+        ip_str = socket.gethostbyname(hostname)
+    except (socket.gaierror, ValueError):
+        # If we can't resolve, allow it (will fail later in httpx)
+        # This prevents DNS errors from blocking legitimate requests
+        return True, "OK"
+
+    return _cache_verdict(hostname, _classify_ip(ip_str))
+
+
+async def _classify_host_async(hostname: str) -> Tuple[bool, str]:
+    """Resolve a hostname without blocking the event loop and classify it."""
+    cached = _cached_verdict(hostname)
+    if cached is not None:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await loop.getaddrinfo(hostname, None, type=socket.SOCK_STREAM)
+        ip_str = infos[0][4][0]
+    except (socket.gaierror, ValueError, IndexError):
+        return True, "OK"
+
+    return _cache_verdict(hostname, _classify_ip(ip_str))
+
+
+def _static_checks(url: str) -> Tuple[Optional[Tuple[bool, str]], Optional[str]]:
+    """
+    Run the scheme/hostname checks that need no DNS.
+
+    Returns (verdict, hostname): verdict is a final answer when the URL
+    can be judged statically, otherwise None with the hostname to resolve.
+    """
+    parsed = urlparse(url)
+
+    # Only allow HTTP and HTTPS
+    if parsed.scheme not in ('http', 'https'):
+        return (False, f"Invalid scheme: {parsed.scheme}. Only HTTP/HTTPS allowed"), None
+
+    hostname = parsed.hostname
+    if not hostname:
+        return (False, "Missing hostname"), None
+
+    # Block localhost explicitly
+    if hostname.lower() in ('localhost', '127.0.0.1', '::1'):
+        return (False, f"Blocked: localhost access not allowed"), None
+
+    return None, hostname
 
 
 def is_safe_origin_url(url: str) -> Tuple[bool, str]:
     """
     SSRF protection: Check if the origin URL is safe to fetch.
-    
+
+    The static checks are cheap string work; the DNS-backed host verdict
+    is cached with a TTL in _host_cache (shared with the async variant),
+    so a host's changed DNS is picked up within a minute rather than
+    pinning the first-seen verdict for the process lifetime.
+
     Blocks:
     - localhost, 127.0.0.0/8 (loopback)
     - 10.0.0.0/8 (private)
@@ -20,74 +138,34 @@ def is_safe_origin_url(url: str) -> Tuple[bool, str]:
     - 192.168.0.0/16 (private)
     - 169.254.0.0/16 (link-local)
     - Non-HTTP(S) schemes
-    
+
     Args:
         url: The origin URL to check
-    
+
     Returns:
         Tuple of (is_safe: bool, reason: str)
     """
     try:
-        parsed = urlparse(url)
-        
-        # Only allow HTTP and HTTPS
-        if parsed.scheme not in ('http', 'https'):
-            return False, f"Invalid scheme: {parsed.scheme}. Only HTTP/HTTPS allowed"
-        
-        hostname = parsed.hostname
-        if not hostname:
-            return False, "Missing hostname"
-        
-        # Block localhost explicitly
-        if hostname.lower() in ('localhost', '127.0.0.1', '::1'):
-            return False, f"Blocked: localhost access not allowed"
-        
-        # Try to resolve and check if it's a private/reserved IP
-        try:
-            # Get IP address
-            ip_str = socket.gethostbyname(hostname)
-            ip = ipaddress.ip_address(ip_str)
-            
-            # Check against specific blocked ranges
-            if ip.is_loopback:
-                return False, f"Blocked: loopback address {ip_str}"
-            
-            if ip.is_private:
-                return False, f"Blocked: private IP address {ip_str}"
-            
-            if ip.is_reserved:
-                return False, f"Blocked: reserved IP address {ip_str}"
-            
-            if ip.is_link_local:
-                return False, f"Blocked: link-local address {ip_str}"
-            
-            # Additional explicit checks for the required ranges
-            # 127.0.0.0/8
-            if ipaddress.ip_address(ip_str) in ipaddress.ip_network('127.0.0.0/8'):
-                return False, f"Blocked: 127.0.0.0/8 range {ip_str}"
-            
-            # 10.0.0.0/8
-            if ipaddress.ip_address(ip_str) in ipaddress.ip_network('10.0.0.0/8'):
-                return False, f"Blocked: 10.0.0.0/8 range {ip_str}"
-            
-            # 172.16.0.0/12
-            if ipaddress.ip_address(ip_str) in ipaddress.ip_network('172.16.0.0/12'):
-                return False, f"Blocked: 172.16.0.0/12 range {ip_str}"
-            
-            # 192.168.0.0/16
-            if ipaddress.ip_address(ip_str) in ipaddress.ip_network('192.168.0.0/16'):
-                return False, f"Blocked: 192.168.0.0/16 range {ip_str}"
-            
-            # 169.254.0.0/16
-            if ipaddress.ip_address(ip_str) in ipaddress.ip_network('169.254.0.0/16'):
-                return False, f"Blocked: 169.254.0.0/16 range {ip_str}"
-                
-        except (socket.gaierror, ValueError) as e:
-            # If we can't resolve, allow it (will fail later in httpx)
-            # This prevents DNS errors from blocking legitimate requests
-            pass
-        
-        return True, "OK"
+        verdict, hostname = _static_checks(url)
+        if verdict is not None:
+            return verdict
+        return _classify_host(hostname)
+    except Exception as e:
+        return False, f"Validation error: {str(e)}"
+
+
+async def is_safe_origin_url_async(url: str) -> Tuple[bool, str]:
+    """
+    Async variant of is_safe_origin_url for request handlers.
+
+    DNS resolution goes through the event loop's thread-pool resolver
+    instead of blocking the loop, and shares the same verdict cache.
+    """
+    try:
+        verdict, hostname = _static_checks(url)
+        if verdict is not None:
+            return verdict
+        return await _classify_host_async(hostname)
     except Exception as e:
         return False, f"Validation error: {str(e)}"
 
@@ -96,10 +174,10 @@ def validate_target_url(url: str) -> None:
     """
     Validate a target URL for SSRF protection.
     Raises an exception if the URL is not safe.
-    
+
     Args:
         url: The URL to validate
-    
+
     Raises:
         ValueError: If the URL is not safe
     """
@@ -0,0 +1,125 @@
+"""
+ProxiBase Site Cache
+In-memory cache of enabled sites so host matching skips the database
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.site import Site
+
+logger = logging.getLogger("proxibase")
+
+# How often the background refresh re-reads sites, as a safety net for
+# changes made outside the admin UI (direct DB edits, other processes)
+REFRESH_INTERVAL_SECONDS = 30
+
+# Built once; reload runs it on every refresh
+_ENABLED_SITES_STMT = select(Site).where(Site.enabled == True)
+
+# Exact mirror_root -> Site, plus a trie over reversed dot-split labels
+# for subdomain matching: 'app.foo.mirror.com' walks com -> mirror ->
+# foo -> app, and any node holding a Site marks a mirror_root the host
+# ends at. Lookup cost is bounded by the host's label count, independent
+# of how many sites are configured. Lookups read these without a lock:
+# reload builds fresh containers and swaps the references, so readers
+# always see a complete snapshot.
+_sites_by_root: Dict[str, Site] = {}
+_suffix_trie: Dict = {}
+_loaded = False
+_reload_lock = asyncio.Lock()
+
+# Trie key under which a node stores its terminating Site; label strings
+# from real hostnames can never collide with it
+_SITE_KEY = None
+
+
+def invalidate_site_cache():
+    """Force the next proxied request to reload sites from the database."""
+    global _loaded
+    _loaded = False
+
+
+async def reload(db: AsyncSession):
+    """
+    Rebuild the cache from the database.
+
+    Args:
+        db: Database session to read enabled sites with
+    """
+    global _sites_by_root, _suffix_trie, _loaded
+
+    async with _reload_lock:
+        result = await db.execute(_ENABLED_SITES_STMT)
+        sites = result.scalars().all()
+
+        by_root = {site.mirror_root: site for site in sites}
+        trie: Dict = {}
+        for site in sites:
+            node = trie
+            for label in reversed(site.mirror_root.split('.')):
+                node = node.setdefault(label, {})
+            node[_SITE_KEY] = site
+
+        _sites_by_root = by_root
+        _suffix_trie = trie
+        _loaded = True
+
+
+async def ensure_loaded(db: AsyncSession):
+    """Load the cache on first use or after invalidation."""
+    if not _loaded:
+        await reload(db)
+
+
+def lookup(host_without_port: str) -> Optional[Site]:
+    """
+    Find the Site serving a host: exact mirror_root match first, then a
+    walk down the suffix trie. Matching whole dot-split labels keeps the
+    '.' boundary, so 'evilmirror.com' never matches 'mirror.com'. When
+    mirror roots nest, the deepest (most specific) one wins.
+
+    Args:
+        host_without_port: The incoming host header, port stripped
+
+    Returns:
+        Site instance or None
+    """
+    site = _sites_by_root.get(host_without_port)
+    if site is not None:
+        return site
+
+    node = _suffix_trie
+    found = None
+    for label in reversed(host_without_port.split('.')):
+        node = node.get(label)
+        if node is None:
+            break
+        terminal = node.get(_SITE_KEY)
+        if terminal is not None:
+            found = terminal
+
+    return found
+
+
+async def refresh_loop():
+    """
+    Periodically rebuild the cache in the background.
+
+    Admin mutations invalidate synchronously; this loop catches changes
+    made behind the application's back.
+    """
+    # Imported here to keep module import free of engine construction
+    from app.db.session import AsyncSessionLocal
+
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+        try:
+            async with AsyncSessionLocal() as session:
+                await reload(session)
+        except Exception as e:
+            logger.error(f"Site cache refresh failed: {str(e)}")
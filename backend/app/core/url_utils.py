@@ -1,6 +1,9 @@
+from functools import lru_cache
+
 from app.core.domain_mapping import map_mirror_host_to_origin_host
 
 
+@lru_cache(maxsize=4096)
 def is_encoded_external_domain(path_segment: str) -> bool:
     """
     Check if a path segment looks like an encoded external domain.
@@ -15,9 +18,13 @@ def is_encoded_external_domain(path_segment: str) -> bool:
     return '.' in path_segment and ' ' not in path_segment
 
 
+@lru_cache(maxsize=4096)
 def build_origin_url(mirror_host: str, mirror_path: str, site_source_root: str, mirror_root: str = None) -> str:
     """
     Build the origin URL from mirror host and path.
+
+    Memoized: the result is a pure function of the arguments, and repeat
+    requests for the same mirror page resolve to a dict hit.
     
     Rules:
     1. If the first path segment looks like a domain (external encoding),
@@ -39,43 +46,50 @@ def build_origin_url(mirror_host: str, mirror_path: str, site_source_root: str,
         The origin URL
     """
     # Ensure path starts with /
-    if not mirror_path.startswith('/'):
+    if mirror_path[:1] != '/':
         mirror_path = '/' + mirror_path
-    
-    # Split path into segments
-    path_parts = mirror_path.lstrip('/').split('/', 1)
-    
-    if not path_parts or not path_parts[0]:
+
+    # Locate the first path segment by index instead of lstrip+split,
+    # which allocated up to three intermediate strings per request
+    start = 1
+    length = len(mirror_path)
+    while start < length and mirror_path[start] == '/':
+        start += 1
+    slash = mirror_path.find('/', start)
+    first_segment = mirror_path[start:] if slash == -1 else mirror_path[start:slash]
+
+    if not first_segment:
         # Empty path
         if mirror_root:
             origin_host = map_mirror_host_to_origin_host(mirror_host, mirror_root, site_source_root)
         else:
             origin_host = site_source_root
         return f"https://{origin_host}/"
-    
-    first_segment = path_parts[0]
-    remaining_path = '/' + path_parts[1] if len(path_parts) > 1 else '/'
-    
+
     # Check if first segment is an encoded external domain
-    if is_encoded_external_domain(first_segment):
+    # (inlined is_encoded_external_domain: has a dot, no spaces)
+    if '.' in first_segment and ' ' not in first_segment:
         # Decode external URL: /abc.external.com/path/to -> https://abc.external.com/path/to
         # If no remaining path, use '/' as default
-        if remaining_path == '/':
+        if slash == -1:
             return f"https://{first_segment}/"
-        return f"https://{first_segment}{remaining_path}"
-    
+        return f"https://{first_segment}{mirror_path[slash:]}"
+
     # Normal mirror mapping
     if mirror_root:
         origin_host = map_mirror_host_to_origin_host(mirror_host, mirror_root, site_source_root)
     else:
         origin_host = site_source_root
-    
+
     return f"https://{origin_host}{mirror_path}"
 
 
+@lru_cache(maxsize=4096)
 def encode_external_url_for_mirror(mirror_root: str, external_host: str, external_path: str) -> str:
     """
     Encode an external URL for the mirror.
+
+    Memoized: pure string assembly, repeated per external link on a page.
     
     Converts https://abc.external.com/path/to into a mirror path:
     /abc.external.com/path/to
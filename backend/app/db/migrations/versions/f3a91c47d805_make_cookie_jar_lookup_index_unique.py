@@ -0,0 +1,42 @@
+"""Make cookie jar lookup index unique
+
+Revision ID: f3a91c47d805
+Revises: ea2bb0e2f943
+Create Date: 2026-08-27 10:12:31.402911
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a91c47d805'
+down_revision: Union[str, Sequence[str], None] = 'ea2bb0e2f943'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # There is logically one row per (site, session, origin); making the
+    # composite index unique lets store_cookies upsert via ON CONFLICT.
+    #
+    # The pre-unique store_cookies was a check-then-insert with no lock,
+    # so existing databases can hold duplicate rows for a key. Keep the
+    # newest (max id) row per key and drop the rest, or the unique index
+    # creation below would fail on exactly those databases.
+    op.execute(
+        "DELETE FROM cookie_jars WHERE id NOT IN ("
+        "SELECT MAX(id) FROM cookie_jars "
+        "GROUP BY site_id, session_id, origin_host)"
+    )
+    op.drop_index('idx_cookie_jar_lookup', table_name='cookie_jars')
+    op.create_index('idx_cookie_jar_lookup', 'cookie_jars', ['site_id', 'session_id', 'origin_host'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_cookie_jar_lookup', table_name='cookie_jars')
+    op.create_index('idx_cookie_jar_lookup', 'cookie_jars', ['site_id', 'session_id', 'origin_host'], unique=False)
@@ -1,14 +1,39 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.config import settings
 
-# Create async engine
+# Create async engine. query_cache_size sizes SQLAlchemy's compiled-SQL
+# cache: the proxy re-issues the same handful of statements (site lookup,
+# session upsert) per request, so a roomy cache keeps them past the
+# compilation step for the life of the process.
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=True,
     future=True,
+    query_cache_size=1200,
 )
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        Tune SQLite for the proxy workload on every new connection.
+
+        WAL lets cookie-jar and admin writes proceed without blocking the
+        proxy's reads; synchronous=NORMAL is safe under WAL and skips an
+        fsync per transaction. The rest sizes the page cache, keeps temp
+        structures off disk, and memory-maps the database file.
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA wal_autocheckpoint=1000")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
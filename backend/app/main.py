@@ -1,22 +1,42 @@
 from fastapi import FastAPI, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+import asyncio
 import os
 import logging
-import json
-from datetime import datetime
+import time
+import orjson
 from app.admin.router import router as admin_router
 from app.proxy.router import router as proxy_router
 from app.config import settings
-from app.core.rate_limiter import init_rate_limiter
+from app.core.http_client import init_http_client, close_http_client
+from app.core.rate_limiter import init_rate_limiter, get_rate_limiter
+from app.core import site_cache
+from app.db.session import engine
+
+# Cached [second, formatted-prefix] pair: gmtime + string formatting run at
+# most once per second no matter how many records are logged
+_TS_CACHE = [0, ""]
+
+
+def _format_timestamp(created: float) -> str:
+    """Format a UTC ISO timestamp, reusing the second-granular prefix."""
+    sec = int(created)
+    cache = _TS_CACHE
+    if cache[0] != sec:
+        t = time.gmtime(sec)
+        cache[1] = "%04d-%02d-%02dT%02d:%02d:%02d" % t[:6]
+        cache[0] = sec
+    return "%s.%06d" % (cache[1], int((created - sec) * 1_000_000))
+
 
 # Phase 9: Configure structured logging
 class JSONFormatter(logging.Formatter):
     """Custom JSON formatter for structured logging"""
-    
+
     def format(self, record):
         log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": _format_timestamp(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -36,7 +56,7 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, 'user_agent'):
             log_data['user_agent'] = record.user_agent
         
-        return json.dumps(log_data)
+        return orjson.dumps(log_data).decode()
 
 # Set up logging
 logger = logging.getLogger("proxibase")
@@ -55,6 +75,39 @@ init_rate_limiter(
 
 app = FastAPI(title="ProxiBase", version="1.0.0")
 
+
+async def _rate_limiter_gc_loop():
+    """
+    Periodically evict idle IPs from the rate limiter.
+
+    Running the sweep in the background keeps eviction off the request
+    path entirely; is_allowed only touches its own client's bucket ring.
+    """
+    limiter = get_rate_limiter()
+    while True:
+        await asyncio.sleep(settings.RATE_LIMIT_WINDOW)
+        limiter.cleanup_old_entries()
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    init_http_client(timeout_seconds=settings.REQUEST_TIMEOUT)
+    asyncio.create_task(_rate_limiter_gc_loop())
+    asyncio.create_task(site_cache.refresh_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    await close_http_client()
+
+
+@app.on_event("shutdown")
+async def optimize_database():
+    # Let SQLite refresh its query-planner statistics before exiting
+    if engine.dialect.name == "sqlite":
+        async with engine.connect() as conn:
+            await conn.exec_driver_sql("PRAGMA optimize")
+
 # Mount static files and templates
 static_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
 template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
@@ -25,7 +25,8 @@ class CookieJar(Base):
     # Relationship to Site
     site = relationship("Site", backref="cookie_jars")
     
-    # Composite index for fast lookups
+    # Unique composite index: one index seek per lookup, and it backs the
+    # ON CONFLICT upsert in store_cookies (one row per site/session/origin)
     __table_args__ = (
-        Index('idx_cookie_jar_lookup', 'site_id', 'session_id', 'origin_host'),
+        Index('idx_cookie_jar_lookup', 'site_id', 'session_id', 'origin_host', unique=True),
     )
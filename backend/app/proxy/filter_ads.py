@@ -3,13 +3,17 @@ ProxiBase Ads/Analytics Filter - Phase 6
 Cleans HTML of ads/analytics and optionally injects custom content
 """
 
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml.etree import ParserError
 from typing import Dict
 import re
 
 
-# Common ad/analytics patterns to match in src attributes
-AD_PATTERNS = [
+# Common ad/analytics patterns to match in src attributes.
+# These are substring patterns, not whole host labels: 'adsystem' must
+# match inside e.g. 'amazon-adsystem.com', so they cannot be probed as an
+# exact-token set. The compiled alternations below scan each input once.
+AD_PATTERNS = (
     'doubleclick',
     'googlesyndication',
     'adsystem',
@@ -18,169 +22,203 @@ AD_PATTERNS = [
     'googletagmanager',
     'google-analytics',
     'googleadservices',
-]
+)
 
 # Patterns to match in inline script content
-INLINE_SCRIPT_PATTERNS = [
+INLINE_SCRIPT_PATTERNS = (
     'gtag(',
     'ga(',
     'GoogleAnalyticsObject',
     'fbq(',
     '_gaq',
     'dataLayer',
-]
+)
+
+# Single compiled alternations so each src/script body is scanned once in
+# the C regex engine instead of once per pattern in Python
+_AD_PATTERN_RE = re.compile('|'.join(map(re.escape, AD_PATTERNS)))
+_INLINE_SCRIPT_RE = re.compile('|'.join(map(re.escape, INLINE_SCRIPT_PATTERNS)))
+
+# Combined pre-filter over the raw document: if none of the patterns occur
+# anywhere, there is nothing to remove and the parse can be skipped
+# entirely. Case-insensitive because src matching lowercases its input; a
+# rare false positive just means we parse and find nothing.
+_ANY_PATTERN_RE = re.compile(
+    '|'.join(map(re.escape, AD_PATTERNS + INLINE_SCRIPT_PATTERNS)),
+    re.IGNORECASE,
+)
+
+
+def _parse_document(html: str):
+    """Parse an HTML document with lxml, returning None if unparseable."""
+    try:
+        return lxml.html.document_fromstring(html)
+    except (ParserError, ValueError):
+        return None
+
+
+def _serialize_document(tree) -> str:
+    """Serialize a parsed document back to a string, keeping the doctype."""
+    return lxml.html.tostring(tree.getroottree(), encoding="unicode")
+
+
+def clean_tree(tree, site_config: Dict) -> None:
+    """
+    Remove ad/analytics elements from an already-parsed document, in place.
+
+    Tree-level core of clean_html, exposed separately so the proxy's HTML
+    pipeline can share one parse between the cleaning and URL-rewriting
+    passes. No-op if both remove_ads and remove_analytics are False.
+    """
+    if not site_config.get('remove_ads', False) and \
+            not site_config.get('remove_analytics', False):
+        return
+
+    # One linear pass over scripts and iframes together:
+    # - <script>/<iframe> with ad/analytics patterns in src are dropped
+    # - inline <script> tags with tracking code are dropped
+    for element in list(tree.iter('script', 'iframe')):
+        src = element.get('src')
+        if src is not None:
+            if _AD_PATTERN_RE.search(src.lower()):
+                # drop_tree removes the element but keeps its tail text
+                element.drop_tree()
+        elif element.tag == 'script':
+            script_content = element.text
+            if script_content and _INLINE_SCRIPT_RE.search(script_content):
+                element.drop_tree()
 
 
 def clean_html(html: str, site_config: Dict) -> str:
     """
     Remove ads and analytics from HTML content.
-    
+
     If both remove_ads and remove_analytics are False, returns HTML unchanged.
     Otherwise, removes:
     - <script> and <iframe> tags with ad/analytics patterns in src
     - Inline <script> tags containing tracking code
-    
+
     Args:
         html: The HTML content to clean
         site_config: Effective configuration dict with keys:
                      - remove_ads (bool)
                      - remove_analytics (bool)
-    
+
     Returns:
         Cleaned HTML string
     """
     # Check if we should do any cleaning
     remove_ads = site_config.get('remove_ads', False)
     remove_analytics = site_config.get('remove_analytics', False)
-    
+
     # If both are False, return unchanged
     if not remove_ads and not remove_analytics:
         return html
-    
-    # Parse HTML
-    soup = BeautifulSoup(html, 'lxml')
-    
-    # Remove <script> tags with ad/analytics patterns in src
-    for script in soup.find_all('script', src=True):
-        src = script.get('src', '').lower()
-        
-        # Check if src matches any ad/analytics pattern
-        should_remove = False
-        for pattern in AD_PATTERNS:
-            if pattern in src:
-                should_remove = True
-                break
-        
-        if should_remove:
-            script.decompose()  # Remove from tree
-    
-    # Remove <script> tags with inline tracking code
-    for script in soup.find_all('script'):
-        # Skip if it has src (already handled above)
-        if script.get('src'):
-            continue
-        
-        # Get script content
-        script_content = script.string
-        if not script_content:
-            continue
-        
-        # Check if content matches any inline script pattern
-        should_remove = False
-        for pattern in INLINE_SCRIPT_PATTERNS:
-            if pattern in script_content:
-                should_remove = True
-                break
-        
-        if should_remove:
-            script.decompose()
-    
-    # Remove <iframe> tags with ad/analytics patterns in src
-    for iframe in soup.find_all('iframe', src=True):
-        src = iframe.get('src', '').lower()
-        
-        # Check if src matches any ad/analytics pattern
-        should_remove = False
-        for pattern in AD_PATTERNS:
-            if pattern in src:
-                should_remove = True
-                break
-        
-        if should_remove:
-            iframe.decompose()
-    
+
+    # Fast raw scan first: most pages contain none of the patterns, and
+    # for those the DOM build is pure waste
+    if not _ANY_PATTERN_RE.search(html):
+        return html
+
+    # Parse HTML with lxml directly; the tree is built entirely in C,
+    # without BeautifulSoup's per-tag Python wrapper objects
+    tree = _parse_document(html)
+    if tree is None:
+        return html
+
+    clean_tree(tree, site_config)
+
     # Return cleaned HTML
-    return str(soup)
+    return _serialize_document(tree)
 
 
 def inject_ads_and_trackers(html: str, site_config: Dict) -> str:
     """
     Inject custom ads and tracking scripts into HTML.
-    
+
     If inject_ads is True and custom_ad_html is not empty:
     - Inject custom_ad_html before </body>
-    
+
     If custom_tracker_js is not empty:
     - Inject <script>custom_tracker_js</script> before </body> or in <head>
-    
+
     Args:
         html: The HTML content to inject into
         site_config: Effective configuration dict with keys:
                      - inject_ads (bool)
                      - custom_ad_html (str)
                      - custom_tracker_js (str)
-    
+
     Returns:
         HTML string with injected content
     """
     inject_ads = site_config.get('inject_ads', False)
     custom_ad_html = site_config.get('custom_ad_html', '')
     custom_tracker_js = site_config.get('custom_tracker_js', '')
-    
+
     # If nothing to inject, return unchanged
     if not custom_ad_html and not custom_tracker_js:
         return html
-    
+
+    # Fast path: splice straight into the document at the closing body
+    # tag - one concatenation instead of a parse + serialize round trip.
+    # Falls through to the parser when no literal </body> is found
+    # (uppercase tags, body-less fragments).
+    idx = html.rfind('</body>')
+    if idx != -1:
+        pieces = [html[:idx]]
+        if inject_ads and custom_ad_html:
+            pieces.append(custom_ad_html)
+        if custom_tracker_js:
+            pieces.append(f'<script>{custom_tracker_js}</script>')
+        pieces.append(html[idx:])
+        return ''.join(pieces)
+
     # Parse HTML
-    soup = BeautifulSoup(html, 'lxml')
-    
-    # Find the body tag
-    body = soup.find('body')
-    
+    tree = _parse_document(html)
+    if tree is None:
+        return html
+
+    # The lxml HTML parser always materializes a <body>
+    body = tree.find('body')
+
     # Inject custom ad HTML before </body> if enabled
-    if inject_ads and custom_ad_html:
-        if body:
-            # Create a new tag from the custom HTML
-            ad_soup = BeautifulSoup(custom_ad_html, 'lxml')
-            # Extract the body content if it was wrapped
-            if ad_soup.body:
-                for child in ad_soup.body.children:
-                    if child.name or (isinstance(child, str) and child.strip()):
-                        body.append(child)
+    if inject_ads and custom_ad_html and body is not None:
+        try:
+            fragments = lxml.html.fragments_fromstring(custom_ad_html)
+        except (ParserError, ValueError):
+            fragments = []
+        for fragment in fragments:
+            if isinstance(fragment, str):
+                # Bare text fragment: attach it as trailing text
+                text = fragment.strip()
+                if not text:
+                    continue
+                if len(body):
+                    last = body[-1]
+                    last.tail = (last.tail or '') + text
+                else:
+                    body.text = (body.text or '') + text
             else:
-                # Just append the parsed content
-                for child in ad_soup.children:
-                    if child.name or (isinstance(child, str) and child.strip()):
-                        body.append(child)
-    
+                body.append(fragment)
+
     # Inject custom tracker JS before </body> or in <head>
     if custom_tracker_js:
         # Create script tag
-        script_tag = soup.new_tag('script')
-        script_tag.string = custom_tracker_js
-        
+        script_tag = lxml.html.Element('script')
+        script_tag.text = custom_tracker_js
+
         # Try to inject before </body>
-        if body:
+        if body is not None:
             body.append(script_tag)
         else:
             # Fallback: inject in <head>
-            head = soup.find('head')
-            if head:
+            head = tree.find('head')
+            if head is not None:
                 head.append(script_tag)
             else:
-                # Last resort: just append to html
-                if soup.html:
-                    soup.html.append(script_tag)
-    
+                # Last resort: just append to the document root
+                tree.append(script_tag)
+
     # Return modified HTML
-    return str(soup)
+    return _serialize_document(tree)
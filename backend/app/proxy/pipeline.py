@@ -0,0 +1,65 @@
+"""
+ProxiBase HTML Pipeline
+Fused clean -> rewrite -> inject pass for proxied HTML pages
+"""
+
+from typing import Dict, Optional, Union
+
+from app.proxy.filter_ads import clean_tree, inject_ads_and_trackers
+from app.proxy.rewriter import (
+    parse_html_document,
+    rewrite_tree,
+    serialize_html_document,
+)
+
+
+def process_html(
+    html: Union[str, bytes],
+    effective_config: Dict,
+    mirror_host: str,
+    mirror_root: str,
+    site_source_root: str,
+    current_page_origin_url: str,
+    content_charset: Optional[str] = None,
+) -> str:
+    """
+    Run the full Phase 6/7 HTML pipeline over a single parse.
+
+    The document is parsed once, the ad/analytics cleaning and URL
+    rewriting passes mutate the shared tree in place, and it is
+    serialized once - one parse/serialize round trip instead of one per
+    step. Custom ad/tracker injection then splices into the resulting
+    string at </body>, which is cheaper than touching the tree.
+
+    Args:
+        html: The origin HTML document. Bytes are handed to lxml's
+            parser directly (it honours the declared encoding), so the
+            proxy never pays a Python-level decode of the body.
+        effective_config: Effective configuration dict
+        mirror_host: The mirror host serving the request (no port)
+        mirror_root: The mirror root domain
+        site_source_root: The source root domain
+        current_page_origin_url: The origin URL of the current page
+        content_charset: Charset from the response Content-Type header,
+            if any; guides the parse of a bytes document
+
+    Returns:
+        The fully processed HTML
+    """
+    tree = parse_html_document(html, encoding=content_charset)
+    if tree is None:
+        # Unparseable passthrough; the contract is still str out
+        processed_html = html.decode('utf-8', errors='ignore') if isinstance(html, bytes) else html
+    else:
+        clean_tree(tree, effective_config)
+        rewrite_tree(
+            tree,
+            mirror_host=mirror_host,
+            mirror_root=mirror_root,
+            site_source_root=site_source_root,
+            effective_config=effective_config,
+            current_page_origin_url=current_page_origin_url,
+        )
+        processed_html = serialize_html_document(tree)
+
+    return inject_ads_and_trackers(processed_html, effective_config)
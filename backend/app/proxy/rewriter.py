@@ -4,15 +4,74 @@ Rewrites HTML content to keep navigation within mirror domains
 Includes JS redirect handling and CSS url() rewriting
 """
 
-from bs4 import BeautifulSoup
+import lxml.html
+from functools import lru_cache
+from lxml import etree
+from lxml.etree import ParserError
 from urllib.parse import urlparse, urljoin
-from typing import Dict, Set
+from typing import Dict, Optional, Set, Tuple
 import re
 from app.models.site import Site
 
 
-# Media and download file extensions that should not be rewritten
-MEDIA_EXTENSIONS = {
+# JS redirect and CSS url() patterns, compiled once at import so the
+# per-script/per-style calls skip the re module's compile-cache lookup.
+
+# One alternation covering all four redirect shapes, so each script is
+# scanned once instead of four times:
+# - window.location.href = "URL"
+# - location.href = "URL"   (not preceded by window.)
+# - location = "URL"        (not preceded by window.)
+# - location.replace("URL")
+# The opening quote is captured and back-referenced, so the closing quote
+# must match it and the replacer can rebuild the statement from groups
+# without rescanning the match.
+_JS_REDIRECT_PATTERN = re.compile(
+    r'((?:window\.location\.href|(?<!window\.)location\.href|(?<!window\.)location)'
+    r'\s*=\s*)(["\'])([^"\']+)\2'
+    r'|(location\.replace\s*\(\s*)(["\'])([^"\']+)\5(\s*\))'
+)
+
+# Matches: url("..."), url('...'), url(...)
+# Group 1 captures the opening quote (possibly empty) and the closing
+# delimiter must match it, so the replacer reuses it by index instead of
+# scanning the match for quote characters
+_CSS_URL_PATTERN = re.compile(r'url\s*\(\s*(["\']?)([^"\')]+)\1\s*\)')
+
+
+# Tag -> URL attribute rewritten by rewrite_html, visited in one tree pass
+_URL_ATTR_MAP = {
+    'a': 'href',
+    'form': 'action',
+    'iframe': 'src',
+    'link': 'href',
+    'script': 'src',
+    'img': 'src',
+    'source': 'src',
+    'video': 'src',
+    'audio': 'src',
+    'base': 'href',
+}
+_REWRITE_TAGS = list(_URL_ATTR_MAP)
+
+# Compiled XPath selecting only elements that actually carry a rewritable
+# attribute, so tag and attribute filtering both happen in C and Python
+# never visits elements with nothing to rewrite. (lxml's iterlinks() was
+# deliberately not used here: it enumerates a much wider attribute set -
+# poster, background, object data, style css - than the documented
+# rewrite surface above.)
+_REWRITE_ELEMENTS_XPATH = etree.XPath(
+    '//a[@href]|//form[@action]|//iframe[@src]|//link[@href]|//script[@src]'
+    '|//img[@src or @srcset]|//source[@src]|//video[@src]|//audio[@src]'
+    '|//base[@href]'
+)
+
+
+# Media and download file extensions that should not be rewritten.
+# A tuple, so it could be fed straight to str.endswith; in practice the
+# compiled alternation below does the same suffix test in one C call
+# while also folding case, so endswith is never needed per URL.
+MEDIA_EXTENSIONS = (
     # Images
     '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.bmp',
     # Videos
@@ -27,12 +86,29 @@ MEDIA_EXTENSIONS = {
     '.apk', '.exe', '.dmg', '.deb', '.rpm',
     # Fonts
     '.ttf', '.woff', '.woff2', '.eot', '.otf',
-}
+)
+
+# One compiled suffix alternation over all media extensions: a single
+# C-level check per path instead of ~49 Python-level endswith calls
+_MEDIA_EXT_RE = re.compile(
+    r'\.(?:' + '|'.join(sorted(re.escape(ext[1:]) for ext in MEDIA_EXTENSIONS)) + r')$',
+    re.IGNORECASE,
+)
+
+
+# Prefix sets for startswith(tuple): one C-level scan over all prefixes
+# instead of a chain of separate startswith calls per URL
+_SKIP_PREFIXES = ('data:', 'javascript:', 'mailto:', '#')
+_ABS_PREFIXES = ('http://', 'https://', '//')
 
 
+@lru_cache(maxsize=8192)
 def is_media_url(url: str) -> bool:
     """
     Check if a URL points to a media or download resource based on file extension.
+
+    Memoized: pages repeat the same asset URLs heavily, and on a hit the
+    check is a dict lookup.
     
     Args:
         url: The URL to check
@@ -42,17 +118,29 @@ def is_media_url(url: str) -> bool:
     """
     if not url:
         return False
-    
-    # Parse URL and get path
-    parsed = urlparse(url)
-    path = parsed.path.lower()
-    
-    # Check if path ends with a media extension
-    for ext in MEDIA_EXTENSIONS:
-        if path.endswith(ext):
-            return True
-    
-    return False
+
+    # Find where the path starts without a full urlparse: after the
+    # authority for absolute/protocol-relative URLs, at 0 for relative
+    # ones. URLs with no path at all (https://host) are never media.
+    if url.startswith(_ABS_PREFIXES):
+        authority_start = url.find('//') + 2
+        path_start = url.find('/', authority_start)
+        if path_start == -1:
+            return False
+    else:
+        path_start = 0
+
+    # Trim query and fragment by index; the regex is bounded to the path
+    end = len(url)
+    cut = url.find('?', path_start)
+    if cut != -1:
+        end = cut
+    cut = url.find('#', path_start, end)
+    if cut != -1:
+        end = cut
+
+    # Check if the path ends with a media extension
+    return _MEDIA_EXT_RE.search(url, path_start, end) is not None
 
 
 def make_absolute_url(url: str, base_url: str) -> str:
@@ -66,11 +154,11 @@ def make_absolute_url(url: str, base_url: str) -> str:
     Returns:
         Absolute URL
     """
-    if not url or url.startswith('data:') or url.startswith('javascript:') or url.startswith('mailto:') or url.startswith('#'):
+    if not url or url.startswith(_SKIP_PREFIXES):
         return url
-    
+
     # If already absolute, return as-is
-    if url.startswith('http://') or url.startswith('https://') or url.startswith('//'):
+    if url.startswith(_ABS_PREFIXES):
         # Handle protocol-relative URLs
         if url.startswith('//'):
             parsed_base = urlparse(base_url)
@@ -81,9 +169,26 @@ def make_absolute_url(url: str, base_url: str) -> str:
     return urljoin(base_url, url)
 
 
+@lru_cache(maxsize=1024)
+def _page_origin_host(page_url: str) -> Optional[str]:
+    """
+    Extract the hostname of a page URL, memoized.
+
+    Every URL on a page is rewritten against the same
+    current_page_origin_url, so after the first call this is a dict hit.
+    """
+    parts = _split_url(page_url)
+    if parts is not None:
+        return parts[0]
+    return urlparse(page_url).hostname
+
+
+@lru_cache(maxsize=4096)
 def url_belongs_to_domain(url: str, domain: str) -> bool:
     """
     Check if a URL belongs to a domain or its subdomains.
+
+    Memoized on the (url, domain) pair; both arguments are immutable.
     
     Args:
         url: The absolute URL to check
@@ -109,14 +214,19 @@ def url_belongs_to_domain(url: str, domain: str) -> bool:
     return False
 
 
+@lru_cache(maxsize=8192)
 def map_origin_host_to_mirror_host(origin_host: str, source_root: str, mirror_root: str) -> str:
     """
     Map an origin host to its mirror host equivalent.
-    
+
     Rules:
     - source.com -> mirror.com
     - xyz.source.com -> xyz.mirror.com
-    
+
+    Memoized: a page repeats the same handful of hosts across hundreds
+    of links, and a hit turns the suffix test, slice and concatenation
+    into one dict lookup.
+
     Args:
         origin_host: The origin host to map
         source_root: The source root domain
@@ -158,6 +268,52 @@ def encode_external_url_path(external_host: str, external_path: str) -> str:
     return f"/{external_host}{external_path}"
 
 
+def _split_url(url: str) -> Optional[Tuple[str, str, str, str]]:
+    """
+    Split an absolute http(s) URL into (hostname, path, query, fragment)
+    with plain str.find and slicing.
+
+    rewrite_url only needs these four pieces, so this skips urlparse's
+    generality (ParseResult allocation, lazy properties) on the hot path.
+    Returns None for anything unusual - no scheme, empty host, userinfo,
+    or bracketed IPv6 - so the caller can fall back to urlparse.
+    """
+    scheme_end = url.find('://')
+    if scheme_end == -1:
+        return None
+    host_start = scheme_end + 3
+
+    # The authority ends at the first '/', '?' or '#', whichever is first
+    end = len(url)
+    for sep in '/?#':
+        i = url.find(sep, host_start, end)
+        if i != -1:
+            end = i
+    netloc = url[host_start:end]
+
+    if '@' in netloc or '[' in netloc:
+        return None
+    colon = netloc.find(':')
+    host = netloc[:colon] if colon != -1 else netloc
+    if not host:
+        return None
+
+    rest = url[end:]
+    fragment = ''
+    query = ''
+    i = rest.find('#')
+    if i != -1:
+        fragment = rest[i + 1:]
+        rest = rest[:i]
+    i = rest.find('?')
+    if i != -1:
+        query = rest[i + 1:]
+        rest = rest[:i]
+
+    # urlparse lowercases the hostname; match that
+    return host.lower(), rest, query, fragment
+
+
 def rewrite_url(
     url: str,
     current_page_origin_url: str,
@@ -189,9 +345,31 @@ def rewrite_url(
         Rewritten URL
     """
     # Skip special URLs
-    if not url or url.startswith('data:') or url.startswith('javascript:') or url.startswith('mailto:') or url.startswith('#'):
+    if not url or url.startswith(_SKIP_PREFIXES):
         return url
-    
+
+    # Fast path: root-relative internal links ('/wiki/Main_Page') are by
+    # far the most common shape on real pages. They resolve to the
+    # current page's host, so when that host sits under source_root the
+    # result is a plain prefix concatenation - no urljoin, no URL split,
+    # and the query/fragment ride along inside the path string unchanged.
+    if url[0] == '/' and not url.startswith('//'):
+        origin_host = _page_origin_host(current_page_origin_url)
+        if origin_host and (
+            origin_host == site_source_root
+            or origin_host.endswith('.' + site_source_root)
+        ):
+            if (
+                is_media_url(url)
+                and effective_config.get('media_policy', 'proxy') == 'bypass'
+            ):
+                return make_absolute_url(url, current_page_origin_url)
+            return ''.join((
+                'https://',
+                map_origin_host_to_mirror_host(origin_host, site_source_root, mirror_root),
+                url,
+            ))
+
     # Make URL absolute
     absolute_url = make_absolute_url(url, current_page_origin_url)
     
@@ -205,52 +383,55 @@ def rewrite_url(
             return absolute_url
         # For 'proxy' or 'size_limited', we continue to rewrite
     
-    # Parse the absolute URL
-    parsed = urlparse(absolute_url)
-    origin_host = parsed.hostname
-    origin_path = parsed.path or '/'
-    query = parsed.query
-    fragment = parsed.fragment
-    
-    if not origin_host:
-        return url
-    
-    # Check if origin_host is same domain or subdomain of source_root
-    is_same_domain = url_belongs_to_domain(absolute_url, site_source_root)
-    
+    # Split the absolute URL with the hand-rolled scanner; urlparse only
+    # runs for the unusual shapes _split_url declines (userinfo, IPv6)
+    parts = _split_url(absolute_url)
+    if parts is not None:
+        origin_host, origin_path, query, fragment = parts
+        origin_path = origin_path or '/'
+    else:
+        parsed = urlparse(absolute_url)
+        origin_host = parsed.hostname
+        origin_path = parsed.path or '/'
+        query = parsed.query
+        fragment = parsed.fragment
+
+        if not origin_host:
+            return url
+    
+    # Check if origin_host is same domain or subdomain of source_root.
+    # Tested directly on the hostname we already extracted, rather than
+    # through url_belongs_to_domain, which would parse the URL again.
+    is_same_domain = (
+        origin_host == site_source_root
+        or origin_host.endswith('.' + site_source_root)
+    )
+    
+    # Assemble the result with one ''.join - a single allocation instead
+    # of the intermediate strings that chained '+=' would create
     if is_same_domain:
         # Map via host transformation
         new_mirror_host = map_origin_host_to_mirror_host(origin_host, site_source_root, mirror_root)
-        
-        # Build mirror URL
-        scheme = 'https'
-        path_with_query = origin_path
-        if query:
-            path_with_query += '?' + query
-        if fragment:
-            path_with_query += '#' + fragment
-        
-        return f"{scheme}://{new_mirror_host}{path_with_query}"
+        parts = ['https://', new_mirror_host, origin_path]
     else:
         # External domain: encode as /external.host/path
         # Check if we should proxy external domains
-        proxy_external = effective_config.get('proxy_external_domains', True)
-        
-        if not proxy_external:
+        if not effective_config.get('proxy_external_domains', True):
             # Don't rewrite, leave pointing to origin
             return absolute_url
-        
-        encoded_path = encode_external_url_path(origin_host, origin_path)
-        
-        # Add query and fragment
-        if query:
-            encoded_path += '?' + query
-        if fragment:
-            encoded_path += '#' + fragment
-        
+
         # Use the mirror_root (not mirror_host, to avoid subdomain confusion)
-        scheme = 'https'
-        return f"{scheme}://{mirror_root}{encoded_path}"
+        parts = ['https://', mirror_root,
+                 encode_external_url_path(origin_host, origin_path)]
+
+    if query:
+        parts.append('?')
+        parts.append(query)
+    if fragment:
+        parts.append('#')
+        parts.append(fragment)
+
+    return ''.join(parts)
 
 
 def rewrite_js_redirects(
@@ -283,23 +464,22 @@ def rewrite_js_redirects(
     """
     if not js_content:
         return js_content
-    
-    # Pattern 1: window.location.href = "URL" or window.location.href = 'URL'
-    pattern1 = r'window\.location\.href\s*=\s*["\']([^"\']+)["\']'
-    
-    # Pattern 2: location.href = "URL" or location.href = 'URL'
-    pattern2 = r'(?<!window\.)location\.href\s*=\s*["\']([^"\']+)["\']'
-    
-    # Pattern 3: location.replace("URL") or location.replace('URL')
-    pattern3 = r'location\.replace\s*\(\s*["\']([^"\']+)["\']\s*\)'
-    
-    # Pattern 4: location = "URL" or location = 'URL' (but not window.location)
-    pattern4 = r'(?<!window\.)location\s*=\s*["\']([^"\']+)["\']'
-    
+
+    # Every redirect shape contains the literal 'location'; most inline
+    # scripts don't, and this substring test is far cheaper than running
+    # the alternation over the whole script
+    if 'location' not in js_content:
+        return js_content
+
     def replace_url(match):
         """Helper function to replace matched URL"""
-        original_url = match.group(1)
-        
+        # Groups 1-3 cover assignment-style redirects, 4-7 location.replace()
+        quote = match.group(2)
+        if quote is not None:
+            prefix, original_url, suffix = match.group(1), match.group(3), ''
+        else:
+            prefix, quote, original_url, suffix = match.group(4, 5, 6, 7)
+
         # Rewrite the URL
         rewritten_url = rewrite_url(
             original_url,
@@ -309,21 +489,14 @@ def rewrite_js_redirects(
             site_source_root,
             effective_config
         )
-        
-        # Return the full match with rewritten URL, preserving quote style
-        full_match = match.group(0)
-        if '"' in full_match:
-            return full_match.replace(original_url, rewritten_url)
-        else:
-            return full_match.replace(original_url, rewritten_url)
-    
-    # Apply all patterns
-    js_content = re.sub(pattern1, replace_url, js_content)
-    js_content = re.sub(pattern2, replace_url, js_content)
-    js_content = re.sub(pattern3, replace_url, js_content)
-    js_content = re.sub(pattern4, replace_url, js_content)
-    
-    return js_content
+
+        # Rebuild the statement from the captured pieces; the quote style
+        # comes straight from its group instead of rescanning the match
+        return f'{prefix}{quote}{rewritten_url}{quote}{suffix}'
+
+
+    # Single pass over the script with the fused pattern
+    return _JS_REDIRECT_PATTERN.sub(replace_url, js_content)
 
 
 def rewrite_css_urls(
@@ -352,19 +525,18 @@ def rewrite_css_urls(
     Returns:
         Rewritten CSS content
     """
-    if not css_content:
+    # Most CSS blocks reference no URLs at all; a substring probe is much
+    # cheaper than handing the whole block to the regex engine
+    if not css_content or 'url(' not in css_content:
         return css_content
-    
-    # Pattern to match url() in CSS
-    # Matches: url("..."), url('...'), url(...)
-    pattern = r'url\s*\(\s*["\']?([^"\')]+)["\']?\s*\)'
-    
+
     def replace_css_url(match):
         """Helper function to replace matched CSS URL"""
-        original_url = match.group(1).strip()
-        
+        quote = match.group(1)
+        original_url = match.group(2).strip()
+
         # Skip data URLs and special URLs
-        if original_url.startswith('data:') or original_url.startswith('#'):
+        if original_url.startswith(('data:', '#')):
             return match.group(0)
         
         # Make absolute
@@ -388,184 +560,336 @@ def rewrite_css_urls(
             effective_config
         )
         
-        # Return with proper CSS url() format
-        # Preserve quote style from original
-        full_match = match.group(0)
-        if '"' in full_match:
-            return f'url("{rewritten_url}")'
-        elif "'" in full_match:
-            return f"url('{rewritten_url}')"
-        else:
-            return f'url({rewritten_url})'
+        # Return with proper CSS url() format, reusing the captured quote
+        # (empty string for unquoted url(...))
+        return f'url({quote}{rewritten_url}{quote})'
     
     # Apply pattern
-    css_content = re.sub(pattern, replace_css_url, css_content)
-    
+    css_content = _CSS_URL_PATTERN.sub(replace_css_url, css_content)
+
     return css_content
 
 
 
-def rewrite_html(
-    html: str,
+# Inline payloads above this size bypass the rewrite memos below. The
+# caches retain both key and value, and inline scripts/stylesheets on
+# proxied origins are attacker-sized - without a bound, 1024 entries of
+# arbitrary length per cache could pin gigabytes. Shared template
+# snippets (the case the memo exists for) are comfortably under this.
+_REWRITE_MEMO_MAX_CONTENT = 16384
+
+
+@lru_cache(maxsize=1024)
+def _memo_rewrite_js(
+    js_content: str,
+    current_page_origin_url: str,
     mirror_host: str,
     mirror_root: str,
     site_source_root: str,
-    effective_config: Dict,
-    current_page_origin_url: str,
+    media_policy: str,
+    proxy_external: bool,
 ) -> str:
     """
-    Rewrite HTML content to transform URLs for mirror navigation.
-    
-    Phase 7: Includes JS redirect and CSS url() rewriting
-    
-    Rewrites these attributes:
-    - <a href>
-    - <form action>
-    - <iframe src>
-    - <link href>
-    - <script src>
-    - <img src> (optionally, based on media_policy)
-    - <source src> (for video/audio)
-    - <video src>
-    - <audio src>
-    
-    Phase 7 additions:
-    - Inline <script> tags: JS redirect patterns (window.location, location.href, etc.)
-    - <style> tags: CSS url() patterns
-    - style attributes: CSS url() patterns
-    
-    Args:
-        html: The HTML content to rewrite
-        mirror_host: The mirror host serving the request
-        mirror_root: The mirror root domain
-        site_source_root: The source root domain
-        effective_config: Effective configuration dict
-        current_page_origin_url: The origin URL of the current page
-    
-    Returns:
-        Rewritten HTML
+    Memoized rewrite_js_redirects over the config bits it actually reads.
+
+    Shared template scripts repeat across a site's pages; on a hit the
+    whole regex pass is skipped. The page origin is part of the key so
+    relative URLs always resolve against the right base. Only reachable
+    through _cached_rewrite_js, which size-gates the entries.
     """
-    if not html:
-        return html
-    
-    # Parse HTML
-    soup = BeautifulSoup(html, 'lxml')
-    
-    # Helper function to rewrite a URL
-    def rewrite(url: str) -> str:
-        return rewrite_url(
-            url,
+    return rewrite_js_redirects(
+        js_content,
+        current_page_origin_url,
+        mirror_host,
+        mirror_root,
+        site_source_root,
+        {'media_policy': media_policy, 'proxy_external_domains': proxy_external},
+    )
+
+
+def _cached_rewrite_js(js_content: str, *key) -> str:
+    """Memoized JS rewrite for small payloads; oversized ones go direct."""
+    if len(js_content) > _REWRITE_MEMO_MAX_CONTENT:
+        current_page_origin_url, mirror_host, mirror_root, site_source_root, media_policy, proxy_external = key
+        return rewrite_js_redirects(
+            js_content,
             current_page_origin_url,
             mirror_host,
             mirror_root,
             site_source_root,
-            effective_config
+            {'media_policy': media_policy, 'proxy_external_domains': proxy_external},
         )
-    
-    # Rewrite <a href>
-    for tag in soup.find_all('a', href=True):
-        tag['href'] = rewrite(tag['href'])
-    
-    # Rewrite <form action>
-    for tag in soup.find_all('form', action=True):
-        tag['action'] = rewrite(tag['action'])
-    
-    # Rewrite <iframe src>
-    for tag in soup.find_all('iframe', src=True):
-        tag['src'] = rewrite(tag['src'])
-    
-    # Rewrite <link href> (stylesheets, icons, etc.)
-    for tag in soup.find_all('link', href=True):
-        tag['href'] = rewrite(tag['href'])
-    
-    # Rewrite <script src>
-    for tag in soup.find_all('script', src=True):
-        tag['src'] = rewrite(tag['src'])
-    
-    # Rewrite <img src> (based on media_policy)
-    for tag in soup.find_all('img', src=True):
-        tag['src'] = rewrite(tag['src'])
-    
-    # Rewrite <img srcset> (responsive images)
-    for tag in soup.find_all('img', srcset=True):
-        # srcset format: "url1 1x, url2 2x" or "url1 100w, url2 200w"
-        srcset = tag['srcset']
-        srcset_parts = []
-        for part in srcset.split(','):
-            part = part.strip()
-            if ' ' in part:
-                url_part, descriptor = part.rsplit(' ', 1)
-                rewritten_url = rewrite(url_part.strip())
-                srcset_parts.append(f"{rewritten_url} {descriptor}")
-            else:
-                srcset_parts.append(rewrite(part))
-        tag['srcset'] = ', '.join(srcset_parts)
-    
-    # Rewrite <source src> (for <video> and <audio>)
-    for tag in soup.find_all('source', src=True):
-        tag['src'] = rewrite(tag['src'])
-    
-    # Rewrite <video src>
-    for tag in soup.find_all('video', src=True):
-        tag['src'] = rewrite(tag['src'])
-    
-    # Rewrite <audio src>
-    for tag in soup.find_all('audio', src=True):
-        tag['src'] = rewrite(tag['src'])
-    
-    # Rewrite <base href> (important for relative URLs)
-    for tag in soup.find_all('base', href=True):
-        tag['base'] = rewrite(tag['href'])
-    
-    # Phase 7: JS and CSS URL rewriting
-    
+    return _memo_rewrite_js(js_content, *key)
+
+
+@lru_cache(maxsize=1024)
+def _memo_rewrite_css(
+    css_content: str,
+    current_page_origin_url: str,
+    mirror_host: str,
+    mirror_root: str,
+    site_source_root: str,
+    media_policy: str,
+    proxy_external: bool,
+) -> str:
+    """Memoized rewrite_css_urls; see _memo_rewrite_js."""
+    return rewrite_css_urls(
+        css_content,
+        current_page_origin_url,
+        mirror_host,
+        mirror_root,
+        site_source_root,
+        {'media_policy': media_policy, 'proxy_external_domains': proxy_external},
+    )
+
+
+def _cached_rewrite_css(css_content: str, *key) -> str:
+    """Memoized CSS rewrite for small payloads; oversized ones go direct."""
+    if len(css_content) > _REWRITE_MEMO_MAX_CONTENT:
+        current_page_origin_url, mirror_host, mirror_root, site_source_root, media_policy, proxy_external = key
+        return rewrite_css_urls(
+            css_content,
+            current_page_origin_url,
+            mirror_host,
+            mirror_root,
+            site_source_root,
+            {'media_policy': media_policy, 'proxy_external_domains': proxy_external},
+        )
+    return _memo_rewrite_css(css_content, *key)
+
+
+@lru_cache(maxsize=16)
+def _html_parser_for(encoding: str):
+    """One lxml parser per charset; parsers are reusable and thread-safe-ish per call."""
+    return lxml.html.HTMLParser(encoding=encoding)
+
+
+def parse_html_document(html, encoding: Optional[str] = None):
+    """
+    Parse an HTML document with lxml, returning None if unparseable.
+
+    Accepts str or bytes. Bytes go straight into lxml's C parser with no
+    Python-level decode pass; the charset is resolved in this order:
+    the caller-supplied encoding (typically from the Content-Type
+    header), then the document's own declaration (libxml2 sniffs it),
+    then UTF-8 when the head carries no charset evidence at all -
+    libxml2's own fallback is latin-1, which mangles the common
+    undeclared-UTF-8 page.
+    """
+    if isinstance(html, bytes):
+        enc = encoding
+        if enc is None and b'charset' not in html[:2048]:
+            enc = 'utf-8'
+        if enc:
+            try:
+                return lxml.html.document_fromstring(html, parser=_html_parser_for(enc))
+            except (ParserError, ValueError):
+                return None
+            except LookupError:
+                # Unknown charset label in the header; fall back to sniffing
+                pass
+    try:
+        return lxml.html.document_fromstring(html)
+    except (ParserError, ValueError):
+        return None
+
+
+def serialize_html_document(tree) -> str:
+    """Serialize a parsed document back to a string, keeping the doctype."""
+    return lxml.html.tostring(tree.getroottree(), encoding="unicode")
+
+
+def rewrite_tree(
+    tree,
+    mirror_host: str,
+    mirror_root: str,
+    site_source_root: str,
+    effective_config: Dict,
+    current_page_origin_url: str,
+) -> None:
+    """
+    Rewrite URLs in an already-parsed document, in place.
+
+    Tree-level core of rewrite_html, exposed separately so the proxy's
+    HTML pipeline can run the cleaning and rewriting passes over one
+    shared parse instead of serializing and reparsing between steps.
+    """
+
+    # Helper function to rewrite a URL, memoized for the page: nav menus
+    # and recurring assets repeat the same URLs many times, and a hit
+    # skips the whole parse/compare/rebuild pipeline. A plain dict scoped
+    # to this call, since effective_config is not hashable for lru_cache.
+    url_cache = {}
+
+    def rewrite(url: str) -> str:
+        rewritten = url_cache.get(url)
+        if rewritten is None:
+            rewritten = url_cache[url] = rewrite_url(
+                url,
+                current_page_origin_url,
+                mirror_host,
+                mirror_root,
+                site_source_root,
+                effective_config
+            )
+        return rewritten
+
+
+    # One pass over every rewritable tag, dispatching on tag name, instead
+    # of a full tree walk per tag type:
+    # <a href>, <form action>, <iframe src>, <link href>, <script src>,
+    # <img src/srcset>, <source src>, <video src>, <audio src>, <base href>
+    for tag in _REWRITE_ELEMENTS_XPATH(tree):
+        name = tag.tag
+        attr = _URL_ATTR_MAP[name]
+        value = tag.get(attr)
+        if value is not None:
+            tag.set(attr, rewrite(value))
+
+        if name == 'img':
+            # Rewrite <img srcset> (responsive images)
+            # srcset format: "url1 1x, url2 2x" or "url1 100w, url2 200w"
+            srcset = tag.get('srcset')
+            if srcset is not None:
+                srcset_parts = []
+                for part in srcset.split(','):
+                    part = part.strip()
+                    if ' ' in part:
+                        url_part, descriptor = part.rsplit(' ', 1)
+                        rewritten_url = rewrite(url_part.strip())
+                        srcset_parts.append(f"{rewritten_url} {descriptor}")
+                    else:
+                        srcset_parts.append(rewrite(part))
+                tag.set('srcset', ', '.join(srcset_parts))
+
+    # Phase 7: JS and CSS URL rewriting, through the cross-page memoized
+    # helpers. Only these two config values influence the result, and
+    # extracting them here gives the caches a hashable key.
+    media_policy = effective_config.get('media_policy', 'proxy')
+    proxy_external = effective_config.get('proxy_external_domains', True)
+
     # Rewrite inline JavaScript for redirect patterns
     if effective_config.get('rewrite_js_redirects', False):
-        for script_tag in soup.find_all('script'):
+        for script_tag in tree.iter('script'):
             # Only process inline scripts (no src attribute)
-            if not script_tag.get('src') and script_tag.string:
-                original_js = script_tag.string
-                rewritten_js = rewrite_js_redirects(
+            if script_tag.get('src') is None and script_tag.text:
+                original_js = script_tag.text
+                rewritten_js = _cached_rewrite_js(
                     original_js,
                     current_page_origin_url,
                     mirror_host,
                     mirror_root,
                     site_source_root,
-                    effective_config
+                    media_policy,
+                    proxy_external,
                 )
                 if rewritten_js != original_js:
-                    script_tag.string = rewritten_js
-    
+                    script_tag.text = rewritten_js
+
     # Rewrite inline CSS <style> tags
-    for style_tag in soup.find_all('style'):
-        if style_tag.string:
-            original_css = style_tag.string
-            rewritten_css = rewrite_css_urls(
+    for style_tag in tree.iter('style'):
+        if style_tag.text:
+            original_css = style_tag.text
+            rewritten_css = _cached_rewrite_css(
                 original_css,
                 current_page_origin_url,
                 mirror_host,
                 mirror_root,
                 site_source_root,
-                effective_config
+                media_policy,
+                proxy_external,
             )
             if rewritten_css != original_css:
-                style_tag.string = rewritten_css
-    
+                style_tag.text = rewritten_css
+
     # Rewrite inline style attributes
-    for tag in soup.find_all(style=True):
-        original_style = tag['style']
+    for tag in tree.xpath('//*[@style]'):
+        original_style = tag.get('style')
         if 'url(' in original_style:
-            rewritten_style = rewrite_css_urls(
+            rewritten_style = _cached_rewrite_css(
                 original_style,
                 current_page_origin_url,
                 mirror_host,
                 mirror_root,
                 site_source_root,
-                effective_config
+                media_policy,
+                proxy_external,
             )
             if rewritten_style != original_style:
-                tag['style'] = rewritten_style
-    
-    # Return the rewritten HTML
-    # Use .decode() to get string, not .prettify() to preserve formatting
-    return str(soup)
+                tag.set('style', rewritten_style)
+
+
+def rewrite_html(
+    html: str,
+    mirror_host: str,
+    mirror_root: str,
+    site_source_root: str,
+    effective_config: Dict,
+    current_page_origin_url: str,
+) -> str:
+    """
+    Rewrite HTML content to transform URLs for mirror navigation.
+
+    Phase 7: Includes JS redirect and CSS url() rewriting
+
+    Rewrites these attributes:
+    - <a href>
+    - <form action>
+    - <iframe src>
+    - <link href>
+    - <script src>
+    - <img src> (optionally, based on media_policy)
+    - <source src> (for video/audio)
+    - <video src>
+    - <audio src>
+
+    Phase 7 additions:
+    - Inline <script> tags: JS redirect patterns (window.location, location.href, etc.)
+    - <style> tags: CSS url() patterns
+    - style attributes: CSS url() patterns
+
+    Args:
+        html: The HTML content to rewrite
+        mirror_host: The mirror host serving the request
+        mirror_root: The mirror root domain
+        site_source_root: The source root domain
+        effective_config: Effective configuration dict
+        current_page_origin_url: The origin URL of the current page
+
+    Returns:
+        Rewritten HTML
+    """
+    if not html:
+        return html
+
+    # Cheapest pass is the one not run: if the document contains none of
+    # the substrings a rewrite could touch (URL-carrying attributes, CSS
+    # url(), JS location redirects), skip the parse/serialize round trip
+    # entirely. Plain C-level substring scans, and common for small
+    # error pages and HTML-typed API responses.
+    if (
+        'href' not in html
+        and 'src' not in html
+        and 'action' not in html
+        and 'url(' not in html
+        and 'location' not in html
+    ):
+        return html
+
+    # Parse HTML with lxml directly - the tree is built in C without
+    # BeautifulSoup's per-node Python wrapper objects
+    tree = parse_html_document(html)
+    if tree is None:
+        return html
+
+    rewrite_tree(
+        tree,
+        mirror_host,
+        mirror_root,
+        site_source_root,
+        effective_config,
+        current_page_origin_url,
+    )
+
+    # Return the rewritten HTML, keeping the doctype
+    return serialize_html_document(tree)
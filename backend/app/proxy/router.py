@@ -5,10 +5,12 @@ Core proxy functionality with cookie jar and session support
 
 from fastapi import APIRouter, Request, Response, Depends
 from fastapi.responses import StreamingResponse
-from sqlalchemy import select
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
-from urllib.parse import urlparse, urljoin, urlunparse, parse_qs, urlencode
+from urllib.parse import urljoin, urlsplit, SplitResult
+from functools import lru_cache
+import asyncio
 import ipaddress
 import socket
 import time
@@ -17,13 +19,19 @@ from typing import Optional, Tuple
 
 from app.db.session import get_db
 from app.models.site import Site
-from app.models.global_config import GlobalConfig
 from app.core.url_utils import build_origin_url, encode_external_url_for_mirror
 from app.core.domain_mapping import map_mirror_host_to_origin_host
-from app.core.config_helper import get_effective_config
-from app.config import settings
-from app.proxy.rewriter import rewrite_html
-from app.proxy.filter_ads import clean_html, inject_ads_and_trackers
+from app.core.config_helper import get_effective_config, get_global_config
+from app.core import site_cache
+from app.config import (
+    ADMIN_HOST,
+    ENABLE_RATE_LIMITING,
+    MAX_RESPONSE_SIZE_MB,
+    RATE_LIMIT_REQUESTS,
+)
+from app.proxy.rewriter import map_origin_host_to_mirror_host
+from app.proxy.pipeline import process_html
+from app.proxy.rewriter import rewrite_css_urls
 from app.core.session_manager import (
     SESSION_COOKIE_NAME,
     create_signed_session_cookie,
@@ -36,8 +44,9 @@ from app.core.cookie_manager import (
     build_cookie_header
 )
 # Phase 9: Import security and rate limiting
-from app.core.security import is_safe_origin_url
+from app.core.security import is_safe_origin_url_async
 from app.core.rate_limiter import get_rate_limiter
+from app.core.http_client import get_http_client
 
 # Phase 9: Set up logger
 logger = logging.getLogger("proxibase")
@@ -66,6 +75,57 @@ FORWARD_HEADERS = {
     'referer',
 }
 
+# The same names as raw bytes, probed while walking request.headers.raw
+# in a single pass (ASGI delivers header names lowercased already)
+FORWARD_HEADERS_BYTES = frozenset(h.encode('latin-1') for h in FORWARD_HEADERS)
+
+
+# Session cookies always carry the same attributes (Phase 8: HttpOnly,
+# SameSite=lax, 30 days, not Secure until HTTPS is on), so the attribute
+# suffix is formatted once at import time.
+_SESSION_COOKIE_SUFFIX = "; HttpOnly; Max-Age=2592000; Path=/; SameSite=lax"
+
+
+def _attach_session_cookie(response: Response, signed_session_id: str) -> None:
+    """
+    Append the signed session cookie to a response.
+
+    Writes the precomputed header straight into raw_headers: one string
+    concatenation instead of Starlette's SimpleCookie/Morsel formatting,
+    and one helper instead of the same set_cookie block at every return
+    branch.
+    """
+    response.raw_headers.append((
+        b'set-cookie',
+        f'{SESSION_COOKIE_NAME}={signed_session_id}{_SESSION_COOKIE_SUFFIX}'.encode('latin-1'),
+    ))
+
+
+def _filter_response_headers(headers) -> dict:
+    """
+    Copy origin response headers, dropping the STRIP_HEADERS set.
+
+    httpx already normalizes header names to lowercase, so the set probe
+    runs directly on each key with no per-header lower() call.
+    """
+    return {
+        name: value
+        for name, value in headers.items()
+        if name not in STRIP_HEADERS
+    }
+
+
+@lru_cache(maxsize=4096)
+def parse_url_cached(url: str) -> SplitResult:
+    """
+    Memoized urlsplit for hot-path URLs.
+
+    A proxy parses the same origin URLs over and over (one page's assets,
+    repeated visits); on a hit this skips the pure-Python parser. urlsplit
+    rather than urlparse, since nothing here reads the params field.
+    """
+    return urlsplit(url)
+
 
 async def find_site_by_host(host: str, db: AsyncSession) -> Optional[Site]:
     """
@@ -84,47 +144,53 @@ async def find_site_by_host(host: str, db: AsyncSession) -> Optional[Site]:
     Returns:
         Site instance or None
     """
-    # Remove port if present
-    host_without_port = host.split(':')[0] if ':' in host else host
-    
-    # Get all enabled sites
-    result = await db.execute(select(Site).where(Site.enabled == True))
-    sites = result.scalars().all()
-    
-    # Try to find a matching site
-    # First try exact match, then try subdomain match
-    for site in sites:
-        mirror_root = site.mirror_root
-        
-        # Exact match
-        if host_without_port == mirror_root:
-            return site
-        
-        # Subdomain match: host ends with .mirror_root
-        if host_without_port.endswith('.' + mirror_root):
-            return site
-    
-    return None
+    # Remove port if present; maxsplit=1 stops at the first colon and
+    # returns the whole string unchanged when there is none
+    host_without_port = host.split(':', 1)[0]
 
+    # Served from the in-memory site cache: the database is only touched
+    # on first use, after an admin mutation, or by the periodic refresh
+    await site_cache.ensure_loaded(db)
+    return site_cache.lookup(host_without_port)
 
-def normalize_redirect_location(location: str, origin_url: str) -> str:
+
+def normalize_redirect_location(
+    location: str,
+    origin_url: str,
+    origin_parsed: Optional[SplitResult] = None,
+) -> str:
     """
     Normalize a redirect Location header to an absolute URL.
-    
+
+    The two dominant shapes are handled without re-parsing anything:
+    absolute URLs pass straight through, and root-relative paths are
+    spliced onto the already-parsed origin. Only path-relative or other
+    unusual locations fall back to urljoin, which parses both URLs.
+
     Args:
         location: The Location header value (may be relative)
         origin_url: The origin URL that returned the redirect
-    
+        origin_parsed: Optional pre-parsed origin_url
+
     Returns:
         Absolute URL
     """
     if not location:
         return location
-    
+
     # If already absolute, return as-is
-    if location.startswith('http://') or location.startswith('https://'):
+    if location.startswith(('http://', 'https://')):
         return location
-    
+
+    # Root-relative (but not protocol-relative //host): splice onto the
+    # parsed origin directly
+    if (
+        origin_parsed is not None
+        and location.startswith('/')
+        and not location.startswith('//')
+    ):
+        return f"{origin_parsed.scheme}://{origin_parsed.netloc}{location}"
+
     # Make relative URL absolute
     return urljoin(origin_url, location)
 
@@ -149,7 +215,7 @@ def map_origin_url_to_mirror(
     Returns:
         Mirror URL
     """
-    parsed = urlparse(origin_url)
+    parsed = parse_url_cached(origin_url)
     origin_host = parsed.hostname or ''
     origin_path = parsed.path or '/'
     query = parsed.query
@@ -163,19 +229,12 @@ def map_origin_url_to_mirror(
     )
     
     if is_same_domain:
-        # Map via reverse domain mapping
-        # origin_host -> mirror_host transformation
-        # e.g., xyz.source.com -> xyz.mirror.com
-        
-        if origin_host == source_root:
-            # Exact match: source.com -> mirror.com
-            new_host = site.mirror_root
-        else:
-            # Subdomain: xyz.source.com -> xyz.mirror.com
-            # Extract subdomain prefix
-            subdomain_prefix = origin_host[:-len(source_root) - 1]
-            new_host = f"{subdomain_prefix}.{site.mirror_root}"
-        
+        # Map via the memoized host transformation shared with the
+        # rewriter, e.g. xyz.source.com -> xyz.mirror.com
+        new_host = map_origin_host_to_mirror_host(
+            origin_host, source_root, site.mirror_root
+        )
+
         # Build mirror URL
         scheme = 'https'  # Always use HTTPS for mirror
         path_with_query = origin_path
@@ -234,17 +293,26 @@ async def proxy_request(
     Returns:
         FastAPI Response
     """
-    # Get global config for effective config merging
-    global_config_result = await db.execute(select(GlobalConfig).where(GlobalConfig.id == 1))
-    global_config = global_config_result.scalar_one_or_none()
-    
-    # If no global config exists, create default
-    if not global_config:
-        global_config = GlobalConfig(id=1)
-        db.add(global_config)
-        await db.commit()
-        await db.refresh(global_config)
-    
+    # Hoist the per-request values every branch below needs: Headers.get
+    # does case-insensitive work per call, and the same fields feed every
+    # structured log line
+    client_ip = request.client.host if request.client else 'unknown'
+    mirror_host_header = request.headers.get('host', '')
+    user_agent = request.headers.get('user-agent', '')
+    log_extra = {
+        'client_ip': client_ip,
+        'mirror_host': mirror_host_header,
+        'origin_url': origin_url,
+        'user_agent': user_agent,
+    }
+    # Checked once so the per-response info lines skip even their dict
+    # merge when the logger runs at WARNING or above
+    info_enabled = logger.isEnabledFor(logging.INFO)
+
+    # Get global config for effective config merging; served from the
+    # process cache except on first use or after an admin write
+    global_config = await get_global_config(db)
+
     # Get effective configuration
     effective_config = get_effective_config(site, global_config)
     
@@ -266,23 +334,28 @@ async def proxy_request(
             session_id = verify_session_id(signed_session_id)
             new_session_created = True
     
-    # Prepare headers to forward
-    forward_headers = {}
-    for header_name in FORWARD_HEADERS:
-        header_value = request.headers.get(header_name)
-        if header_value:
-            forward_headers[header_name] = header_value
-    
+    # Prepare headers to forward: one walk over the raw ASGI header list
+    # instead of a case-insensitive Headers lookup per forwarded name
+    forward_headers = {
+        name.decode('latin-1'): value.decode('latin-1')
+        for name, value in request.headers.raw
+        if name in FORWARD_HEADERS_BYTES and value
+    }
+    
+    # Parse the origin URL once; the hostname is reused for the Host
+    # header and both cookie-jar passes below
+    origin_parsed = parse_url_cached(origin_url)
+    origin_host = origin_parsed.hostname
+
     # Override Host header with origin host
-    origin_parsed = urlparse(origin_url)
-    forward_headers['Host'] = origin_parsed.hostname
+    forward_headers['Host'] = origin_host
     
     # === PHASE 8: REFERER REWRITING ===
     # Rewrite Referer header to origin domain
     if 'referer' in forward_headers:
         referer = forward_headers['referer']
         # Parse referer and rewrite host to origin
-        referer_parsed = urlparse(referer)
+        referer_parsed = parse_url_cached(referer)
         if referer_parsed.hostname:
             # Map mirror host back to origin host
             # This is a simplified approach - just use origin host
@@ -291,7 +364,6 @@ async def proxy_request(
     # === PHASE 8: COOKIE JAR - INJECT COOKIES ===
     if session_id and effective_config.get('session_mode') == 'cookie_jar':
         # Retrieve stored cookies for this origin
-        origin_host = origin_parsed.hostname
         stored_cookies = await get_cookies(db, site.id, session_id, origin_host)
         
         if stored_cookies:
@@ -300,46 +372,45 @@ async def proxy_request(
             if cookie_header:
                 forward_headers['Cookie'] = cookie_header
     
-    # Get request body if present
+    # Get request body if present. GET/HEAD traffic - the overwhelming
+    # majority on a proxy - never touches the body stream at all
+    method = request.method
     body = None
-    if request.method in ('POST', 'PUT', 'PATCH'):
+    if method in ('POST', 'PUT', 'PATCH'):
         body = await request.body()
     
     # Phase 9: Start timing for latency measurement
     start_time = time.time()
     
-    # Make request to origin with redirect following disabled
-    # Phase 9: Use configurable timeout
-    timeout_seconds = settings.REQUEST_TIMEOUT
-    async with httpx.AsyncClient(follow_redirects=False, timeout=timeout_seconds) as client:
-        try:
-            response = await client.request(
-                method=request.method,
-                url=origin_url,
-                headers=forward_headers,
-                content=body,
-                params=None,  # Query params already in origin_url
-            )
-        except httpx.RequestError as e:
-            # Phase 9: Log error
-            latency_ms = int((time.time() - start_time) * 1000)
-            logger.error(
-                f"Error fetching origin: {str(e)}",
-                extra={
-                    'client_ip': request.client.host if request.client else 'unknown',
-                    'mirror_host': request.headers.get('host', ''),
-                    'origin_url': origin_url,
-                    'status_code': 502,
-                    'latency_ms': latency_ms,
-                    'user_agent': request.headers.get('user-agent', '')
-                }
-            )
-            # Return error response
-            return Response(
-                content=f"Error fetching origin: {str(e)}",
-                status_code=502,
-                media_type="text/plain"
-            )
+    # Make request to origin through the shared client: its keep-alive
+    # pool reuses origin connections across requests, so repeat fetches
+    # skip the per-request TCP + TLS handshake. Redirect following stays
+    # disabled and the configured timeout is set on the client itself.
+    # The response is opened in streaming mode: headers arrive first and
+    # the body is only pulled when a branch needs it, so large non-HTML
+    # bodies never get buffered in memory.
+    client = get_http_client()
+    try:
+        origin_request = client.build_request(
+            method=method,
+            url=origin_url,
+            headers=forward_headers,
+            content=body,
+        )
+        response = await client.send(origin_request, stream=True)
+    except httpx.RequestError as e:
+        # Phase 9: Log error
+        latency_ms = int((time.time() - start_time) * 1000)
+        logger.error(
+            "Error fetching origin: %s", str(e),
+            extra=log_extra | {'status_code': 502, 'latency_ms': latency_ms}
+        )
+        # Return error response
+        return Response(
+            content=f"Error fetching origin: {str(e)}",
+            status_code=502,
+            media_type="text/plain"
+        )
     
     # Phase 9: Calculate latency
     latency_ms = int((time.time() - start_time) * 1000)
@@ -347,7 +418,7 @@ async def proxy_request(
     # Phase 9: Check response size for non-media content
     content_type = response.headers.get('content-type', '')
     content_length = response.headers.get('content-length')
-    max_size_bytes = settings.MAX_RESPONSE_SIZE_MB * 1024 * 1024
+    max_size_bytes = MAX_RESPONSE_SIZE_MB * 1024 * 1024
     
     # Only check size for non-media content
     is_media = any(media_type in content_type.lower() for media_type in [
@@ -356,18 +427,13 @@ async def proxy_request(
     
     if not is_media and content_length:
         if int(content_length) > max_size_bytes:
+            await response.aclose()
             logger.warning(
-                f"Response size exceeds limit: {content_length} bytes",
-                extra={
-                    'client_ip': request.client.host if request.client else 'unknown',
-                    'mirror_host': request.headers.get('host', ''),
-                    'origin_url': origin_url,
-                    'status_code': 413,
-                    'latency_ms': latency_ms,
-                }
+                "Response size exceeds limit: %s bytes", content_length,
+                extra=log_extra | {'status_code': 413, 'latency_ms': latency_ms}
             )
             return Response(
-                content=f"Response too large: {int(content_length) / (1024*1024):.1f}MB exceeds {settings.MAX_RESPONSE_SIZE_MB}MB limit",
+                content=f"Response too large: {int(content_length) / (1024*1024):.1f}MB exceeds {MAX_RESPONSE_SIZE_MB}MB limit",
                 status_code=413,
                 media_type="text/plain"
             )
@@ -379,21 +445,24 @@ async def proxy_request(
         
         if set_cookie_headers:
             # Store cookies in database
-            origin_host = origin_parsed.hostname
             await store_cookies(db, site.id, session_id, origin_host, set_cookie_headers)
     
     # Handle redirects (3xx status codes)
     if 300 <= response.status_code < 400:
         location = response.headers.get('location')
         if location:
-            # Normalize to absolute URL
-            absolute_location = normalize_redirect_location(location, origin_url)
+            # Only the headers matter for a redirect; drop the body
+            await response.aclose()
+            # Normalize to absolute URL, reusing the parsed origin
+            absolute_location = normalize_redirect_location(
+                location, origin_url, origin_parsed
+            )
             
             # Map to mirror URL
             mirror_location = map_origin_url_to_mirror(
                 absolute_location,
                 site,
-                request.headers.get('host', site.mirror_root)
+                mirror_host_header or site.mirror_root
             )
             
             # Return redirect with rewritten Location
@@ -412,62 +481,51 @@ async def proxy_request(
             
             # === PHASE 8: SET SESSION COOKIE ===
             if new_session_created and session_id:
-                redirect_response.set_cookie(
-                    key=SESSION_COOKIE_NAME,
-                    value=signed_session_id,
-                    httponly=True,
-                    secure=False,  # Set to True in production with HTTPS
-                    samesite='lax',
-                    max_age=86400 * 30  # 30 days
-                )
+                _attach_session_cookie(redirect_response, signed_session_id)
             
             # Phase 9: Log redirect
-            logger.info(
-                f"Proxy redirect: {origin_url} -> {mirror_location}",
-                extra={
-                    'client_ip': request.client.host if request.client else 'unknown',
-                    'mirror_host': request.headers.get('host', ''),
-                    'origin_url': origin_url,
-                    'status_code': response.status_code,
-                    'latency_ms': latency_ms,
-                    'user_agent': request.headers.get('user-agent', '')
-                }
-            )
+            if info_enabled:
+                logger.info(
+                    "Proxy redirect: %s -> %s", origin_url, mirror_location,
+                    extra=log_extra | {
+                        'status_code': response.status_code,
+                        'latency_ms': latency_ms,
+                    }
+                )
             
             return redirect_response
     
     # For non-redirect responses, filter headers and return content
-    response_headers = {}
-    for header_name, header_value in response.headers.items():
-        header_lower = header_name.lower()
-        if header_lower not in STRIP_HEADERS:
-            response_headers[header_name] = header_value
+    response_headers = _filter_response_headers(response.headers)
     
     # Get content type
     content_type = response.headers.get('content-type', '')
+    content_type_lower = content_type.lower()
     
     # For HTML, rewrite links and return
-    if 'text/html' in content_type.lower():
-        # Decode HTML content
-        html_content = response.content.decode('utf-8', errors='ignore')
-        
-        # Phase 6: HTML Processing Pipeline
-        # Step 1: Clean ads/analytics from origin HTML
-        cleaned_html = clean_html(html_content, effective_config)
+    if 'text/html' in content_type_lower or 'application/xhtml+xml' in content_type_lower:
+        # HTML must be rewritten as a whole, so read the full body here.
+        # The bytes go into the pipeline undecoded - lxml parses them
+        # honouring the page's declared encoding, which both skips a
+        # full decode pass and handles non-UTF-8 pages correctly
+        html_bytes = await response.aread()
+        await response.aclose()
         
-        # Step 2: Rewrite URLs for mirror navigation
-        rewritten_html = rewrite_html(
-            html=cleaned_html,
-            mirror_host=request.headers.get('host', site.mirror_root).split(':')[0],
+        # Phase 6: HTML Processing Pipeline (fused clean -> rewrite ->
+        # inject over one parse), run in a worker thread so the event
+        # loop keeps serving other requests while this page is processed
+        # (lxml's C parser releases the GIL while it runs)
+        final_html = await asyncio.to_thread(
+            process_html,
+            html_bytes,
+            effective_config,
+            mirror_host=(mirror_host_header or site.mirror_root).split(':', 1)[0],
             mirror_root=site.mirror_root,
             site_source_root=site.source_root,
-            effective_config=effective_config,
-            current_page_origin_url=origin_url
+            current_page_origin_url=origin_url,
+            content_charset=response.charset_encoding,
         )
         
-        # Step 3: Inject custom ads/trackers
-        final_html = inject_ads_and_trackers(rewritten_html, effective_config)
-        
         html_response = Response(
             content=final_html,
             status_code=response.status_code,
@@ -477,60 +535,102 @@ async def proxy_request(
         
         # === PHASE 8: SET SESSION COOKIE ===
         if new_session_created and session_id:
-            html_response.set_cookie(
-                key=SESSION_COOKIE_NAME,
-                value=signed_session_id,
-                httponly=True,
-                secure=False,  # Set to True in production with HTTPS
-                samesite='lax',
-                max_age=86400 * 30  # 30 days
-            )
+            _attach_session_cookie(html_response, signed_session_id)
         
         # Phase 9: Log HTML response
-        logger.info(
-            f"Proxy HTML: {origin_url}",
-            extra={
-                'client_ip': request.client.host if request.client else 'unknown',
-                'mirror_host': request.headers.get('host', ''),
-                'origin_url': origin_url,
-                'status_code': response.status_code,
-                'latency_ms': latency_ms,
-                'user_agent': request.headers.get('user-agent', '')
-            }
-        )
+        if info_enabled:
+            logger.info(
+                "Proxy HTML: %s", origin_url,
+                extra=log_extra | {
+                    'status_code': response.status_code,
+                    'latency_ms': latency_ms,
+                }
+            )
         
         return html_response
     
-    # For other content types, stream the response
-    other_response = Response(
-        content=response.content,
+    # Stylesheets get the url() pass: external CSS carries the same
+    # origin references as inline <style> blocks, and without this
+    # branch they would stream through still pointing at the origin.
+    # CSS bodies are small text, so read whole and rewrite off the
+    # event loop like HTML. Everything else skips rewriting entirely.
+    if 'text/css' in content_type_lower:
+        css_bytes = await response.aread()
+        await response.aclose()
+        charset = response.charset_encoding or 'utf-8'
+        try:
+            css_content = css_bytes.decode(charset, errors='ignore')
+        except LookupError:
+            css_content = css_bytes.decode('utf-8', errors='ignore')
+
+        final_css = await asyncio.to_thread(
+            rewrite_css_urls,
+            css_content,
+            origin_url,
+            (mirror_host_header or site.mirror_root).split(':', 1)[0],
+            site.mirror_root,
+            site.source_root,
+            effective_config,
+        )
+
+        css_response = Response(
+            content=final_css,
+            status_code=response.status_code,
+            headers=response_headers,
+            media_type=content_type
+        )
+
+        # === PHASE 8: SET SESSION COOKIE ===
+        if new_session_created and session_id:
+            _attach_session_cookie(css_response, signed_session_id)
+
+        # Phase 9: Log CSS response
+        if info_enabled:
+            logger.info(
+                "Proxy CSS: %s", origin_url,
+                extra=log_extra | {
+                    'status_code': response.status_code,
+                    'latency_ms': latency_ms,
+                }
+            )
+
+        return css_response
+
+    # For other content types, stream the body straight through: bytes
+    # flow origin -> client in chunks with constant memory, instead of
+    # buffering whole media files. aiter_raw skips httpx's content
+    # decoding, so a gzip/brotli body from the origin is forwarded
+    # compressed instead of being decompressed here only for the client
+    # to fetch it uncompressed. The bytes are exactly what the origin
+    # framed, so its Content-Encoding and Content-Length headers are
+    # restored after the generic strip; the background task returns the
+    # connection to the pool once the body is sent.
+    content_encoding = response.headers.get('content-encoding')
+    if content_encoding:
+        response_headers['content-encoding'] = content_encoding
+    if content_length:
+        response_headers['content-length'] = content_length
+
+    other_response = StreamingResponse(
+        response.aiter_raw(),
         status_code=response.status_code,
-        headers=response_headers
+        headers=response_headers,
+        background=BackgroundTask(response.aclose)
     )
     
     # === PHASE 8: SET SESSION COOKIE ===
     if new_session_created and session_id:
-        other_response.set_cookie(
-            key=SESSION_COOKIE_NAME,
-            value=signed_session_id,
-            httponly=True,
-            secure=False,  # Set to True in production with HTTPS
-            samesite='lax',
-            max_age=86400 * 30  # 30 days
-        )
+        _attach_session_cookie(other_response, signed_session_id)
     
     # Phase 9: Log other response
-    logger.info(
-        f"Proxy content: {origin_url}",
-        extra={
-            'client_ip': request.client.host if request.client else 'unknown',
-            'mirror_host': request.headers.get('host', ''),
-            'origin_url': origin_url,
-            'status_code': response.status_code,
-            'latency_ms': latency_ms,
-            'user_agent': request.headers.get('user-agent', '')
-        }
-    )
+    if info_enabled:
+        logger.info(
+            "Proxy content: %s", origin_url,
+            extra=log_extra | {
+                'status_code': response.status_code,
+                'latency_ms': latency_ms,
+            }
+        )
     
     return other_response
 
@@ -548,10 +648,13 @@ async def proxy_handler(
     Matches incoming host against Site mirror_root and proxies to source_root.
     """
     host = request.headers.get('host', '')
+    # Strip the port once up front; every downstream consumer wants the
+    # bare hostname
+    host_no_port = host.split(':', 1)[0]
     client_ip = request.client.host if request.client else 'unknown'
     
     # Phase 9: Rate limiting check
-    if settings.ENABLE_RATE_LIMITING:
+    if ENABLE_RATE_LIMITING:
         rate_limiter = get_rate_limiter()
         if rate_limiter:
             is_allowed, remaining = rate_limiter.is_allowed(client_ip)
@@ -559,7 +662,7 @@ async def proxy_handler(
             if not is_allowed:
                 retry_after = rate_limiter.get_retry_after(client_ip)
                 logger.warning(
-                    f"Rate limit exceeded for {client_ip}",
+                    "Rate limit exceeded for %s", client_ip,
                     extra={
                         'client_ip': client_ip,
                         'mirror_host': host,
@@ -571,24 +674,24 @@ async def proxy_handler(
                     status_code=429,
                     headers={
                         'Retry-After': str(retry_after),
-                        'X-RateLimit-Limit': str(settings.RATE_LIMIT_REQUESTS),
+                        'X-RateLimit-Limit': str(RATE_LIMIT_REQUESTS),
                         'X-RateLimit-Remaining': '0',
                         'X-RateLimit-Reset': str(retry_after)
                     }
                 )
     
     # If host is admin host, don't proxy (return 404)
-    if host == settings.ADMIN_HOST or host.startswith('0.0.0.0') or host.startswith('localhost'):
+    if host == ADMIN_HOST or host.startswith('0.0.0.0') or host.startswith('localhost'):
         return Response(
             content="Not found",
             status_code=404
         )
     
     # Find matching site
-    site = await find_site_by_host(host, db)
+    site = await find_site_by_host(host_no_port, db)
     if not site:
         logger.warning(
-            f"No site configured for host: {host}",
+            "No site configured for host: %s", host,
             extra={'client_ip': client_ip, 'mirror_host': host, 'status_code': 404}
         )
         return Response(
@@ -604,17 +707,17 @@ async def proxy_handler(
         mirror_path += '?' + request.url.query
     
     origin_url = build_origin_url(
-        mirror_host=host.split(':')[0],
+        mirror_host=host_no_port,
         mirror_path=mirror_path,
         site_source_root=site.source_root,
         mirror_root=site.mirror_root
     )
     
     # Phase 9: SSRF protection with detailed reason
-    is_safe, reason = is_safe_origin_url(origin_url)
+    is_safe, reason = await is_safe_origin_url_async(origin_url)
     if not is_safe:
         logger.warning(
-            f"SSRF blocked: {reason}",
+            "SSRF blocked: %s", reason,
             extra={
                 'client_ip': client_ip,
                 'mirror_host': host,
@@ -3,188 +3,260 @@ End-to-End Test for Phase 6
 Tests the complete proxy system with ad/analytics removal and injection
 """
 
+import io
+import sys
 import asyncio
 import httpx
-from sqlalchemy import select, update
+
+# The suite is almost entirely network waits, so run it on uvloop's C
+# event loop when available; the stock selector loop is the fallback
+# (uvloop is optional and unavailable on Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+else:
+    uvloop.install()
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import AsyncSessionLocal
 from app.models.site import Site
 from app.models.global_config import GlobalConfig
 
 
-async def setup_test_site():
+_SEP60 = "=" * 60
+
+
+def _banner(title, out=sys.stdout):
+    """Write a section banner with one buffered call instead of three prints."""
+    out.write(f"\n{_SEP60}\n{title}\n{_SEP60}\n\n")
+
+
+async def _upsert_site(session, values):
+    """
+    Get-or-create a Site row with one statement.
+
+    A single upsert against the unique mirror_root index replaces the
+    old select + insert/update + refresh flow - one round-trip instead
+    of three, with RETURNING handing back the fresh row directly.
+    """
+    stmt = (
+        sqlite_insert(Site)
+        .values(**values)
+        .on_conflict_do_update(
+            index_elements=["mirror_root"],
+            set_={k: v for k, v in values.items() if k != "mirror_root"},
+        )
+        .returning(Site)
+    )
+    site = (await session.execute(stmt)).scalar_one()
+    await session.commit()
+    return site
+
+
+async def setup_test_site(out):
     """Setup a test site with Phase 6 configuration."""
     async with AsyncSessionLocal() as session:
-        # Get or create Wikipedia test site
-        result = await session.execute(
-            select(Site).where(Site.source_root == "en.wikipedia.org")
-        )
-        site = result.scalar_one_or_none()
-        
-        if not site:
-            # Create new site
-            site = Site(
-                mirror_root="wiki.test.local",
-                source_root="en.wikipedia.org",
-                enabled=True,
-                remove_ads=True,
-                remove_analytics=True,
-                inject_ads=True,
-                custom_ad_html='<div style="background: #ffeb3b; padding: 10px; text-align: center;">🎯 ProxiBase Custom Ad - Phase 6 Working!</div>',
-                custom_tracker_js='console.log("ProxiBase Phase 6 Tracker Active");'
-            )
-            session.add(site)
-        else:
-            # Update existing site with Phase 6 config
-            site.remove_ads = True
-            site.remove_analytics = True
-            site.inject_ads = True
-            site.custom_ad_html = '<div style="background: #ffeb3b; padding: 10px; text-align: center;">🎯 ProxiBase Custom Ad - Phase 6 Working!</div>'
-            site.custom_tracker_js = 'console.log("ProxiBase Phase 6 Tracker Active");'
-        
-        await session.commit()
-        await session.refresh(site)
-        
-        print(f"✅ Test site configured: {site.mirror_root} -> {site.source_root}")
-        print(f"   - Remove Ads: {site.remove_ads}")
-        print(f"   - Remove Analytics: {site.remove_analytics}")
-        print(f"   - Inject Ads: {site.inject_ads}")
+        site = await _upsert_site(session, dict(
+            mirror_root="wiki.test.local",
+            source_root="en.wikipedia.org",
+            enabled=True,
+            remove_ads=True,
+            remove_analytics=True,
+            inject_ads=True,
+            custom_ad_html='<div style="background: #ffeb3b; padding: 10px; text-align: center;">🎯 ProxiBase Custom Ad - Phase 6 Working!</div>',
+            custom_tracker_js='console.log("ProxiBase Phase 6 Tracker Active");'
+        ))
+
+        print(f"✅ Test site configured: {site.mirror_root} -> {site.source_root}", file=out)
+        print(f"   - Remove Ads: {site.remove_ads}", file=out)
+        print(f"   - Remove Analytics: {site.remove_analytics}", file=out)
+        print(f"   - Inject Ads: {site.inject_ads}", file=out)
         
         return site
 
 
-async def test_proxy_with_phase6():
+async def test_proxy_with_phase6(client: httpx.AsyncClient):
     """Test the proxy system with Phase 6 features."""
-    print("\n" + "="*60)
-    print("Testing Phase 6 with Wikipedia proxy")
-    print("="*60 + "\n")
-    
+    # Each concurrent test writes its report into its own in-memory
+    # buffer and flushes it once at the end: one write syscall per test
+    # instead of one per line, and the two gathered tests' output never
+    # interleaves. (contextlib.redirect_stdout would be global state
+    # shared across tasks, so the buffer is threaded explicitly.)
+    buf = io.StringIO()
+    try:
+        return await _run_proxy_with_phase6(client, buf)
+    finally:
+        sys.stdout.write(buf.getvalue())
+
+
+async def _run_proxy_with_phase6(client: httpx.AsyncClient, out):
+    _banner("Testing Phase 6 with Wikipedia proxy", out)
+
     # Setup test site
-    site = await setup_test_site()
-    
-    # Make a request to the proxy
-    async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-        try:
-            # Request Wikipedia main page through the proxy
-            # Note: In production, this would be a real request to the mirror domain
-            # For testing, we'll use the backend directly with custom headers
-            response = await client.get(
-                "http://localhost:8001/wiki/Main_Page",
-                headers={
-                    "Host": "wiki.test.local"
-                }
-            )
-            
-            if response.status_code == 200:
-                html = response.text
-                
-                print(f"✅ Successfully proxied Wikipedia (status: {response.status_code})")
-                print(f"   Response size: {len(html)} bytes\n")
-                
-                # Check Phase 6 features
-                checks = {
-                    "Custom ad injected": "ProxiBase Custom Ad - Phase 6 Working!" in html,
-                    "Custom tracker injected": "ProxiBase Phase 6 Tracker Active" in html,
-                    "Main content present": "Wikipedia" in html or "wiki" in html.lower(),
-                }
-                
-                print("Phase 6 Feature Checks:")
-                all_passed = True
-                for check_name, result in checks.items():
-                    status = "✅" if result else "❌"
-                    print(f"  {status} {check_name}")
-                    if not result:
-                        all_passed = False
-                
-                if all_passed:
-                    print("\n🎉 All Phase 6 E2E tests passed!")
-                else:
-                    print("\n⚠️  Some checks failed")
-                
-                return all_passed
-            else:
-                print(f"❌ Request failed with status: {response.status_code}")
-                print(f"   Response: {response.text[:200]}")
+    site = await setup_test_site(out)
+
+    # Make a request to the proxy. Only the network call can
+    # legitimately raise here, so the handler wraps just that - the
+    # happy path stays exception-free and failures surface as a
+    # returned False instead of a formatted traceback.
+    #
+    # The body is streamed and collected as bytes: the checks below are
+    # substring probes, so decoding the whole page to str would only add
+    # a UTF-8 upcast the assertions never need.
+    try:
+        # Request Wikipedia main page through the proxy
+        # Note: In production, this would be a real request to the mirror domain
+        # For testing, we'll use the backend directly with custom headers
+        async with client.stream(
+            "GET",
+            "http://localhost:8001/wiki/Main_Page",
+            headers={
+                "Host": "wiki.test.local"
+            }
+        ) as response:
+            if response.status_code != 200:
+                detail = await response.aread()
+                print(f"❌ Request failed with status: {response.status_code}", file=out)
+                print(f"   Response: {detail[:200]!r}", file=out)
                 return False
-                
-        except Exception as e:
-            print(f"❌ Error during test: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
 
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+    except httpx.HTTPError as e:
+        print(f"❌ Error during test: {e!r}", file=out)
+        return False
 
-async def test_clean_html_feature():
-    """Test that ads/analytics are removed when configured."""
-    print("\n" + "="*60)
-    print("Testing Ad/Analytics Removal")
-    print("="*60 + "\n")
-    
+    print(f"✅ Successfully proxied Wikipedia (status: {response.status_code})", file=out)
+    print(f"   Response size: {len(body)} bytes\n", file=out)
+
+    # Check Phase 6 features
+    checks = {
+        "Custom ad injected": "ProxiBase Custom Ad - Phase 6 Working!".encode() in body,
+        "Custom tracker injected": b"ProxiBase Phase 6 Tracker Active" in body,
+        "Main content present": b"Wikipedia" in body or b"wiki" in bytes(body).lower(),
+    }
+
+    print("Phase 6 Feature Checks:", file=out)
+    all_passed = True
+    for check_name, result in checks.items():
+        status = "✅" if result else "❌"
+        print(f"  {status} {check_name}", file=out)
+        if not result:
+            all_passed = False
+
+    if all_passed:
+        print("\n🎉 All Phase 6 E2E tests passed!", file=out)
+    else:
+        print("\n⚠️  Some checks failed", file=out)
+
+    return all_passed
+
+
+async def setup_clean_only_site(out):
+    """
+    Setup a second test site configured for removal without injection.
+
+    Uses its own Site row (different source_root), so this test and
+    test_proxy_with_phase6 touch disjoint rows and can run concurrently.
+    """
     async with AsyncSessionLocal() as session:
-        # Update site to enable cleaning but disable injection
-        result = await session.execute(
-            select(Site).where(Site.source_root == "en.wikipedia.org")
+        site = await _upsert_site(session, dict(
+            mirror_root="wiki-clean.test.local",
+            source_root="simple.wikipedia.org",
+            enabled=True,
+            remove_ads=True,
+            remove_analytics=True,
+            inject_ads=False,
+            custom_ad_html=None,
+            custom_tracker_js=None,
+        ))
+
+        print("✅ Site configured for ad/analytics removal only", file=out)
+        print("   Custom injection disabled for this test\n", file=out)
+
+        return site
+
+
+async def test_clean_html_feature(client: httpx.AsyncClient):
+    """Test that ads/analytics are removed when configured."""
+    buf = io.StringIO()
+    try:
+        return await _run_clean_html_feature(client, buf)
+    finally:
+        sys.stdout.write(buf.getvalue())
+
+
+async def _run_clean_html_feature(client: httpx.AsyncClient, out):
+    _banner("Testing Ad/Analytics Removal", out)
+
+    site = await setup_clean_only_site(out)
+
+    # Make request; the handler wraps only the network call
+    try:
+        response = await client.get(
+            "http://localhost:8001/wiki/Main_Page",
+            headers={"Host": site.mirror_root}
         )
-        site = result.scalar_one_or_none()
-        
-        if site:
-            site.remove_ads = True
-            site.remove_analytics = True
-            site.inject_ads = False
-            site.custom_ad_html = None
-            site.custom_tracker_js = None
-            await session.commit()
-            
-            print("✅ Site configured for ad/analytics removal only")
-            print("   Custom injection disabled for this test\n")
-            
-            # Make request
-            async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-                try:
-                    response = await client.get(
-                        "http://localhost:8001/wiki/Main_Page",
-                        headers={"Host": "wiki.test.local"}
-                    )
-                    
-                    if response.status_code == 200:
-                        html = response.text
-                        print(f"✅ Response received (size: {len(html)} bytes)")
-                        
-                        # Note: Wikipedia might not have these exact patterns,
-                        # but we can verify the processing pipeline worked
-                        print("✅ Ad/Analytics removal pipeline executed successfully")
-                        return True
-                    else:
-                        print(f"❌ Request failed: {response.status_code}")
-                        return False
-                        
-                except Exception as e:
-                    print(f"❌ Error: {e}")
-                    return False
-        else:
-            print("❌ Test site not found")
-            return False
+    except httpx.HTTPError as e:
+        print(f"❌ Error: {e!r}", file=out)
+        return False
+
+    if response.status_code != 200:
+        print(f"❌ Request failed: {response.status_code}", file=out)
+        return False
+
+    html = response.text
+    print(f"✅ Response received (size: {len(html)} bytes)", file=out)
+
+    # Note: Wikipedia might not have these exact patterns,
+    # but we can verify the processing pipeline worked
+    print("✅ Ad/Analytics removal pipeline executed successfully", file=out)
+    return True
 
 
 async def main():
     """Run all E2E tests."""
-    print("\n" + "="*60)
+    print("\n" + _SEP60)
     print("ProxiBase - Phase 6 E2E Test Suite")
-    print("="*60)
+    print(_SEP60)
     
     try:
-        # Test 1: Full Phase 6 features
-        result1 = await test_proxy_with_phase6()
-        
-        # Test 2: Ad/Analytics removal only
-        result2 = await test_clean_html_feature()
-        
-        print("\n" + "="*60)
+        # The two tests target disjoint Site rows, so their network
+        # waits overlap on one event loop instead of running back to
+        # back. return_exceptions keeps one failure from cancelling the
+        # other mid-flight.
+        # One shared client for the whole suite: its keep-alive pool
+        # stays warm across tests, so only the first request pays the
+        # TCP handshake. The backend is served by uvicorn over h11, so
+        # HTTP/2 multiplexing buys nothing here - HTTP/1.1 keep-alive
+        # with a small bounded pool covers the suite's handful of GETs
+        async with httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=30.0,
+            limits=httpx.Limits(
+                max_keepalive_connections=8,
+                max_connections=8,
+                keepalive_expiry=30.0,
+            ),
+        ) as client:
+            result1, result2 = await asyncio.gather(
+                test_proxy_with_phase6(client),    # Test 1: Full Phase 6 features
+                test_clean_html_feature(client),   # Test 2: Ad/Analytics removal only
+                return_exceptions=True,
+            )
+        for result in (result1, result2):
+            if isinstance(result, BaseException):
+                raise result
+
+        print("\n" + _SEP60)
         if result1 and result2:
             print("✅ All Phase 6 E2E tests completed successfully!")
         else:
             print("⚠️  Some E2E tests encountered issues")
-        print("="*60 + "\n")
+        print(_SEP60 + "\n")
         
     except Exception as e:
         print(f"\n❌ Test suite failed: {e}")
@@ -5,9 +5,8 @@ Tests the complete cookie jar flow with actual proxy requests
 
 import asyncio
 import httpx
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy import select
+from app.db.session import AsyncSessionLocal
 from app.models.site import Site
 from app.models.cookie_jar import CookieJar
 
@@ -24,9 +23,11 @@ async def test_cookie_jar_flow():
     print("=" * 60)
     print()
     
-    # Connect to database
-    engine = create_async_engine('sqlite+aiosqlite:///./app.db')
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    # Use the app's shared engine: it is a module singleton with the
+    # SQLite WAL/pragma tuning applied per connection, so the test runs
+    # against the same pool the proxy uses instead of spinning up (and
+    # disposing) a second engine on the same file
+    async_session = AsyncSessionLocal
     
     async with async_session() as session:
         # Get wiki.test.local site
@@ -223,7 +224,6 @@ async def test_cookie_jar_flow():
     print("✓ All integration tests passed!")
     print("=" * 60)
     
-    await engine.dispose()
     return True
 
 
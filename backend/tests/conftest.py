@@ -0,0 +1,13 @@
+"""
+Shared test configuration.
+
+Must run before any app import: settings are frozen at startup, so the
+bcrypt work factor has to be in the environment before app.config loads.
+Rounds=4 is bcrypt's minimum and cuts each hash from ~250ms to ~1ms;
+verify_password is work-factor agnostic, so the auth tests are
+unaffected beyond the speedup.
+"""
+
+import os
+
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
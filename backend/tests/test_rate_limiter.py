@@ -0,0 +1,63 @@
+import pytest
+from app.core.rate_limiter import InMemoryRateLimiter
+
+
+class TestRateLimiter:
+    """Test the bucketed sliding-window rate limiter."""
+
+    def test_allows_up_to_limit(self):
+        """Requests up to max_requests are admitted with decreasing remaining."""
+        limiter = InMemoryRateLimiter(max_requests=3, window_seconds=60)
+        assert limiter.is_allowed("1.2.3.4") == (True, 2)
+        assert limiter.is_allowed("1.2.3.4") == (True, 1)
+        assert limiter.is_allowed("1.2.3.4") == (True, 0)
+
+    def test_blocks_over_limit(self):
+        """The request after the limit is rejected with zero remaining."""
+        limiter = InMemoryRateLimiter(max_requests=2, window_seconds=60)
+        limiter.is_allowed("1.2.3.4")
+        limiter.is_allowed("1.2.3.4")
+        allowed, remaining = limiter.is_allowed("1.2.3.4")
+        assert allowed is False
+        assert remaining == 0
+
+    def test_ips_tracked_independently(self):
+        """One IP hitting its limit does not affect another."""
+        limiter = InMemoryRateLimiter(max_requests=1, window_seconds=60)
+        limiter.is_allowed("1.2.3.4")
+        allowed, _ = limiter.is_allowed("1.2.3.4")
+        assert allowed is False
+        allowed, _ = limiter.is_allowed("5.6.7.8")
+        assert allowed is True
+
+    def test_retry_after_within_window(self):
+        """Retry-after for a blocked IP is within (0, window]."""
+        limiter = InMemoryRateLimiter(max_requests=1, window_seconds=60)
+        limiter.is_allowed("1.2.3.4")
+        retry_after = limiter.get_retry_after("1.2.3.4")
+        assert 0 < retry_after <= 60
+
+    def test_retry_after_unknown_ip(self):
+        """An IP with no recorded requests has nothing to wait for."""
+        limiter = InMemoryRateLimiter(max_requests=1, window_seconds=60)
+        assert limiter.get_retry_after("9.9.9.9") == 0
+
+    def test_reset_single_ip(self):
+        """Resetting an IP clears its window without touching others."""
+        limiter = InMemoryRateLimiter(max_requests=1, window_seconds=60)
+        limiter.is_allowed("1.2.3.4")
+        limiter.is_allowed("5.6.7.8")
+        limiter.reset("1.2.3.4")
+        allowed, _ = limiter.is_allowed("1.2.3.4")
+        assert allowed is True
+        allowed, _ = limiter.is_allowed("5.6.7.8")
+        assert allowed is False
+
+    def test_reset_all(self):
+        """Resetting with no argument clears every IP."""
+        limiter = InMemoryRateLimiter(max_requests=1, window_seconds=60)
+        limiter.is_allowed("1.2.3.4")
+        limiter.is_allowed("5.6.7.8")
+        limiter.reset()
+        assert limiter.is_allowed("1.2.3.4")[0] is True
+        assert limiter.is_allowed("5.6.7.8")[0] is True
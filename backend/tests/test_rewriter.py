@@ -0,0 +1,39 @@
+from app.proxy.rewriter import rewrite_html
+
+
+DEFAULT_CONFIG = {
+    'media_policy': 'proxy',
+    'proxy_external_domains': True,
+    'rewrite_js_redirects': False,
+}
+
+
+class TestRewriteHtmlBaseTag:
+    """Test <base href> handling in rewrite_html."""
+
+    def test_base_href_is_rewritten(self):
+        """<base href> pointing at the source domain maps to the mirror."""
+        html = '<html><head><base href="https://source.com/"></head><body></body></html>'
+        result = rewrite_html(
+            html,
+            mirror_host="mirror.com",
+            mirror_root="mirror.com",
+            site_source_root="source.com",
+            effective_config=DEFAULT_CONFIG,
+            current_page_origin_url="https://source.com/page",
+        )
+        assert 'href="https://mirror.com/"' in result
+
+    def test_base_gets_no_spurious_attribute(self):
+        """The rewrite must target href, not add a bogus base= attribute."""
+        html = '<html><head><base href="https://source.com/sub/"></head><body></body></html>'
+        result = rewrite_html(
+            html,
+            mirror_host="mirror.com",
+            mirror_root="mirror.com",
+            site_source_root="source.com",
+            effective_config=DEFAULT_CONFIG,
+            current_page_origin_url="https://source.com/page",
+        )
+        assert 'base=' not in result
+        assert 'href="https://source.com/sub/"' not in result